@@ -2492,7 +2492,10 @@ function PainterWidget(node, inputName, inputData, app) {
         });
         res(img_);
       };
-      img.src = images[0];
+      // Piped images arrive as data URLs or as /view URLs of temp files
+      img.src = images[0].startsWith("data:")
+        ? images[0]
+        : api.apiURL(images[0]);
     })
       .then(async (result) => {
         switch (node.LS_Cls.LS_Painters.settings.pipingSettings.action.name) {
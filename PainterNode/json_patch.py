@@ -0,0 +1,145 @@
+class JsonPatchError(ValueError):
+    pass
+
+
+def _parse_pointer(pointer):
+    if pointer == "":
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def _index(container, token, for_insert=False):
+    if token == "-" and for_insert:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not for_insert):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _get(doc, parts):
+    for token in parts:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Path not found: {token!r}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token)]
+        else:
+            raise JsonPatchError(f"Cannot traverse into {type(doc).__name__}")
+    return doc
+
+
+def _update(doc, parts, change):
+    """
+    Return a copy of ``doc`` with ``change(container, token)`` applied to
+    the parent of ``parts``. Only the containers along the path are copied,
+    everything else is shared with ``doc``.
+    """
+    if not parts:
+        raise JsonPatchError("Operation on the document root is not supported")
+    if isinstance(doc, dict):
+        doc = dict(doc)
+    elif isinstance(doc, list):
+        doc = list(doc)
+    else:
+        raise JsonPatchError(f"Cannot traverse into {type(doc).__name__}")
+
+    token = parts[0]
+    if len(parts) == 1:
+        change(doc, token)
+        return doc
+    if isinstance(doc, dict):
+        if token not in doc:
+            raise JsonPatchError(f"Path not found: {token!r}")
+        doc[token] = _update(doc[token], parts[1:], change)
+    else:
+        index = _index(doc, token)
+        doc[index] = _update(doc[index], parts[1:], change)
+    return doc
+
+
+def _add(value):
+    def change(container, token):
+        if isinstance(container, dict):
+            container[token] = value
+        else:
+            container.insert(_index(container, token, for_insert=True), value)
+    return change
+
+
+def _remove(container, token):
+    if isinstance(container, dict):
+        if token not in container:
+            raise JsonPatchError(f"Path not found: {token!r}")
+        del container[token]
+    else:
+        del container[_index(container, token)]
+
+
+def _replace(value):
+    def change(container, token):
+        _remove(container, token)
+        _add(value)(container, token)
+    return change
+
+
+def _json_equal(a, b):
+    """Equality of JSON values as RFC 6902 ``test`` defines it: ``true`` is not ``1``."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and a == b
+    if isinstance(a, dict) or isinstance(b, dict):
+        return (isinstance(a, dict) and isinstance(b, dict) and a.keys() == b.keys()
+                and all(_json_equal(a[key], b[key]) for key in a))
+    if isinstance(a, list) or isinstance(b, list):
+        return (isinstance(a, list) and isinstance(b, list) and len(a) == len(b)
+                and all(_json_equal(x, y) for x, y in zip(a, b)))
+    return a == b
+
+
+def apply_patch(doc, operations):
+    """
+    Apply an RFC 6902 JSON patch to ``doc`` and return the patched document.
+
+    ``doc`` itself is never modified: every operation copies just the
+    containers on its path, so a failing patch leaves the original intact and
+    unchanged parts of a large document are shared instead of copied.
+    """
+    if not isinstance(operations, list):
+        raise JsonPatchError("Patch must be a list of operations")
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise JsonPatchError("Patch operation must be an object")
+        op = operation.get("op")
+        parts = _parse_pointer(operation.get("path"))
+
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"'{op}' operation requires a value")
+
+        if op == "add":
+            doc = _update(doc, parts, _add(operation["value"]))
+        elif op == "remove":
+            doc = _update(doc, parts, _remove)
+        elif op == "replace":
+            doc = _update(doc, parts, _replace(operation["value"]))
+        elif op in ("move", "copy"):
+            source = _parse_pointer(operation.get("from"))
+            value = _get(doc, source)
+            if op == "move":
+                if parts[: len(source)] == source and parts != source:
+                    raise JsonPatchError("Cannot move a value into one of its children")
+                doc = _update(doc, source, _remove)
+            doc = _update(doc, parts, _add(value))
+        elif op == "test":
+            if not _json_equal(_get(doc, parts), operation["value"]):
+                raise JsonPatchError(f"Test failed at {operation['path']!r}")
+        else:
+            raise JsonPatchError(f"Unknown patch operation: {op!r}")
+    return doc
@@ -107,6 +107,49 @@ function formatBytes(bytes, decimals = 2) {
 }
 
 // LocalStorage Init
+// JSON pointer token for an object key
+function escapePointer(key) {
+  return String(key).replace(/~/g, "~0").replace(/\//g, "~1");
+}
+
+// JSON patch (RFC 6902) operations turning "before" into "after"
+function diffJSON(before, after, path = "", ops = []) {
+  if (before === after) return ops;
+
+  const isObject = (value) => value !== null && typeof value === "object";
+  if (
+    !isObject(before) ||
+    !isObject(after) ||
+    Array.isArray(before) !== Array.isArray(after)
+  ) {
+    ops.push({ op: "replace", path, value: after });
+    return ops;
+  }
+
+  if (Array.isArray(after)) {
+    const common = Math.min(before.length, after.length);
+    for (let i = 0; i < common; i++)
+      diffJSON(before[i], after[i], `${path}/${i}`, ops);
+    for (let i = before.length - 1; i >= after.length; i--)
+      ops.push({ op: "remove", path: `${path}/${i}` });
+    for (let i = common; i < after.length; i++)
+      ops.push({ op: "add", path: `${path}/-`, value: after[i] });
+    return ops;
+  }
+
+  for (const key of Object.keys(before)) {
+    if (!Object.hasOwn(after, key))
+      ops.push({ op: "remove", path: `${path}/${escapePointer(key)}` });
+  }
+  for (const key of Object.keys(after)) {
+    const keyPath = `${path}/${escapePointer(key)}`;
+    if (!Object.hasOwn(before, key))
+      ops.push({ op: "add", path: keyPath, value: after[key] });
+    else diffJSON(before[key], after[key], keyPath, ops);
+  }
+  return ops;
+}
+
 class LS_Class {
   constructor(nodeName, painters_settings_json = false) {
     if (!nodeName || typeof nodeName !== "string" || nodeName.trim() === "") {
@@ -115,6 +158,10 @@ class LS_Class {
     this.painters_settings_json = painters_settings_json;
     this.name = nodeName;
     this.LS_Painters = {};
+    // Last state the server confirmed and its revision, saves send a patch against it
+    this.revision = null;
+    this.savedState = null;
+    this.saving = Promise.resolve();
   }
 
   getLS() {
@@ -194,14 +241,24 @@ class LS_Class {
     }
   }
 
-  // Write settings in the file json
-  async saveData() {
+  // Write settings in the file json, one save at a time so revisions stay in order
+  saveData() {
+    this.saving = this.saving.then(() => this.writeData());
+    return this.saving;
+  }
+
+  async writeData() {
     try {
+      const json = JSON.stringify(this.LS_Painters);
+      const current = JSON.parse(json);
+
+      if (await this.patchData(current, json.length)) return;
+
       const formData = new FormData();
       formData.append("name", this.name);
       formData.append(
         "data",
-        new Blob([JSON.stringify(this.LS_Painters)], {
+        new Blob([json], {
           type: "application/json",
         })
       );
@@ -211,12 +268,53 @@ class LS_Class {
         body: formData,
       });
       if (rawResponse.status !== 200) {
+        this.revision = this.savedState = null;
         throw new Error(
           `Error painter save file settings ${rawResponse.statusText}`
         );
       }
+
+      const data = await rawResponse.json();
+      this.revision = data.revision ?? null;
+      this.savedState = current;
+    } catch (e) {
+      console.log(e);
+    }
+  }
+
+  // Send only the changes since the last saved revision, false means a full save is needed
+  async patchData(current, fullSize) {
+    if (this.revision === null || this.savedState === null) return false;
+
+    const patch = diffJSON(this.savedState, current);
+    if (!patch.length) return true;
+
+    const body = JSON.stringify({
+      name: this.name,
+      revision: this.revision,
+      patch,
+    });
+    if (body.length > fullSize / 2) return false;
+
+    try {
+      const rawResponse = await fetch("/alekpet/patch_node_settings", {
+        method: "POST",
+        headers: {
+          Accept: "application/json",
+          "Content-Type": "application/json",
+        },
+        body,
+      });
+      // 409: settings changed elsewhere since our revision
+      if (rawResponse.status !== 200) return false;
+
+      const data = await rawResponse.json();
+      this.revision = data.revision;
+      this.savedState = current;
+      return true;
     } catch (e) {
       console.log(e);
+      return false;
     }
   }
 
@@ -234,6 +332,8 @@ class LS_Class {
       const data = await rawResponse?.json();
       if (!data) return {};
 
+      this.revision = data.revision ?? null;
+      this.savedState = JSON.parse(JSON.stringify(data.settings_nodes));
       return data.settings_nodes;
     } catch (e) {
       console.log(e);
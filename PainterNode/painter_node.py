@@ -1,19 +1,26 @@
-import hashlib
 import os
 import json
 from server import PromptServer
 from aiohttp import web
 import base64
-from io import BytesIO
+import threading
+import uuid
+from urllib.parse import urlencode
 import asyncio
-from PIL import Image, ImageOps
-import torch
-import numpy as np
-import glob
+import errno
 import folder_paths
 
+from ..dir_index import list_files
+from ..file_fingerprint import file_fingerprint
+from ..image_convert import encode_images
+from ..image_loader import load_image_tensors
+from .json_patch import JsonPatchError
+from .settings_store import RevisionMismatch, SettingsStore
+
 # Directory node save settings
-CHUNK_SIZE = 1024
+CHUNK_SIZE = 256 * 1024
+# Largest painter settings payload accepted by save_node_settings
+MAX_SETTINGS_BYTES = int(os.environ.get("ALEKPET_PAINTER_MAX_SETTINGS_BYTES", 64 * 1024 * 1024))
 dir_painter_node = os.path.dirname(__file__)
 extension_path = os.path.join(os.path.abspath(dir_painter_node))
 nodes_settings_path = os.path.join(extension_path, "settings_nodes")
@@ -43,40 +50,17 @@ def isFileName(filename):
     return True
 
 
-def create_settings_json(filename):
-    try:
-        json_file = os.path.join(nodes_settings_path, filename)
-        if not os.path.isfile(json_file):
-            print(f"File settings for '{filename}' is not found! Create file!")
-            with open(json_file, "w") as f:
-                json.dump({}, f)
+settings_store = SettingsStore(nodes_settings_path, PREFIX)
 
-    except Exception as e:
-        print(f"Error: ${e}")
 
+async def ensure_settings_loaded():
+    # First request reads the settings files in a worker thread, later ones hit memory
+    if not settings_store.loaded:
+        await asyncio.get_running_loop().run_in_executor(None, settings_store.ensure_loaded)
 
-def get_settings_json(filename, notExistCreate=True):
-    if not isFileName(filename):
-        return {}
-
-    json_file = os.path.join(nodes_settings_path, filename)
-    if os.path.isfile(json_file):
-        f = open(json_file, "rb")
-        try:
-            load_data = json.load(f)
-            return load_data
-        except Exception as e:
-            print("Error load json file: ", e)
-            if notExistCreate:
-                f.close()
-                os.remove(json_file)
-                create_settings_json(filename)
-        finally:
-            f.close()
-    else:
-        create_settings_json(filename)
 
-    return {}
+def raw_json_response(body, status=200):
+    return web.Response(body=body, status=status, content_type="application/json")
 
 
 # Load json file
@@ -84,36 +68,26 @@ def get_settings_json(filename, notExistCreate=True):
 async def loadingSettings(request):
     filename = request.match_info.get("nodeName", None)
     if not isFileName(filename):
-        load_data = {}
+        load_data, revision = b"{}", None
     else:
-        load_data = get_settings_json(filename + PREFIX)
+        await ensure_settings_loaded()
+        load_data, revision = settings_store.get_revision(filename)
 
-    return web.json_response({"settings_nodes": load_data})
+    return raw_json_response(
+        b'{"revision": ' + json.dumps(revision).encode("utf-8") + b', "settings_nodes": ' + load_data + b"}"
+    )
 
 
 # Load json's files
 @PromptServer.instance.routes.get("/alekpet/loading_all_node_settings")
 async def loadingAllSettings(request):
-    load_data = []
-    jsonFiles = glob.glob("Paint_*.json", root_dir=nodes_settings_path)
+    await ensure_settings_loaded()
+    load_data = [
+        b'{"name": ' + json.dumps(name).encode("utf-8") + b', "value": ' + raw + b"}"
+        for name, raw in settings_store.items("Paint_")
+    ]
 
-    for f in jsonFiles:
-        path_to_file = os.path.join(nodes_settings_path, f)
-
-        if os.path.isfile(path_to_file):
-            file = open(path_to_file, "rb")
-            try:
-                jsonData = json.load(file)
-                load_data.append({"name":f.replace(PREFIX,""), "value": jsonData})
-            except Exception as e:
-                print("Error load json file: ", e)
-
-            finally:
-                file.close()
-        else:
-            print(f"File {f} not file!")
-
-    return web.json_response({"all_settings_nodes": load_data})
+    return raw_json_response(b'{"all_settings_nodes": [' + b", ".join(load_data) + b"]}")
 
 
 # Save data to json file
@@ -125,6 +99,11 @@ async def saveSettings(request):
                 {"error": "multipart/* content type expected"}, status=400
             )
 
+        if request.content_length is not None and request.content_length > MAX_SETTINGS_BYTES + CHUNK_SIZE:
+            return web.json_response(
+                {"error": f"Painter data exceeds {MAX_SETTINGS_BYTES} bytes"}, status=413
+            )
+
         reader = await request.multipart()
         filename_reader = await reader.next()
         filename = await filename_reader.text()
@@ -132,26 +111,33 @@ async def saveSettings(request):
         data_reader = await reader.next()
 
         if isFileName(filename):
-            filename = filename + PREFIX
-            json_file = os.path.join(nodes_settings_path, filename)
-
-            if os.path.isfile(json_file):
-                with open(json_file, "wb") as f:
-                    while True:
-                        chunk = await data_reader.read_chunk(size=CHUNK_SIZE)
-                        if not chunk:
-                            break
-                        f.write(chunk)
-
+            await ensure_settings_loaded()
+
+            created = not settings_store.exists(filename)
+            data = bytearray()
+            while True:
+                chunk = await data_reader.read_chunk(size=CHUNK_SIZE)
+                if not chunk:
+                    break
+                data.extend(chunk)
+                if len(data) > MAX_SETTINGS_BYTES:
+                    return web.json_response(
+                        {"error": f"Painter data exceeds {MAX_SETTINGS_BYTES} bytes"}, status=413
+                    )
+
+            # Validate off the loop, a broken payload never replaces good settings
+            data = bytes(data)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, json.loads, data)
+            except ValueError as e:
                 return web.json_response(
-                    {"message": "Painter data saved successfully"}, status=200
+                    {"error": f"Painter data is not valid JSON: {e}"}, status=400
                 )
+            # The first save stores the payload too, the revision returned always matches what was sent
+            revision = settings_store.save(filename, data)
 
-            else:
-                create_settings_json(filename)
-                return web.json_response(
-                    {"message": "Painter file settings created!"}, status=200
-                )
+            message = "Painter file settings created!" if created else "Painter data saved successfully"
+            return web.json_response({"message": message, "revision": revision}, status=200)
 
         else:
             raise Exception("Filename is not found or incorrect!")
@@ -161,6 +147,41 @@ async def saveSettings(request):
         return web.json_response({"error": str(e)}, status=500)
 
 
+# Apply a JSON patch (RFC 6902) made against a known revision of the settings
+@PromptServer.instance.routes.post("/alekpet/patch_node_settings")
+async def patchSettings(request):
+    if request.content_length is not None and request.content_length > MAX_SETTINGS_BYTES:
+        return web.json_response(
+            {"error": f"Painter data exceeds {MAX_SETTINGS_BYTES} bytes"}, status=413
+        )
+
+    try:
+        json_data = await request.json()
+        filename = json_data.get("name")
+        revision = json_data.get("revision")
+        operations = json_data.get("patch")
+    except (ValueError, AttributeError) as e:
+        return web.json_response({"error": f"Invalid patch request: {e}"}, status=400)
+
+    if not isFileName(filename):
+        return web.json_response({"error": "Filename is not found or incorrect!"}, status=400)
+
+    await ensure_settings_loaded()
+    try:
+        revision = await asyncio.get_running_loop().run_in_executor(
+            None, settings_store.patch, filename, revision, operations
+        )
+    except KeyError:
+        return web.json_response({"error": f"Painter settings '{filename}' not found"}, status=404)
+    except RevisionMismatch as e:
+        # The client falls back to a full save_node_settings
+        return web.json_response({"error": str(e), "revision": e.revision}, status=409)
+    except JsonPatchError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    return web.json_response({"message": "Painter data patched successfully", "revision": revision}, status=200)
+
+
 # Remove file settings painter node data
 @PromptServer.instance.routes.post("/alekpet/remove_node_settings")
 async def removeSettings(request):
@@ -169,10 +190,9 @@ async def removeSettings(request):
         filename = json_data.get("name")
 
         if isFileName(filename):
-            filename = filename + PREFIX
-            json_file = os.path.join(nodes_settings_path, filename)
-
-            os.remove(json_file)
+            await ensure_settings_loaded()
+            if not settings_store.remove(filename):
+                raise FileNotFoundError(errno.ENOENT, "No such file or directory", settings_store.file_path(filename))
             return web.json_response(
                 {"message": "Painter data removed successfully"}, status=200
             )
@@ -184,15 +204,78 @@ async def removeSettings(request):
 
 
 # Piping image
-PAINTER_DICT = {}  # Painter nodes dict instances
+# Seconds painter_execute waits for the frontend to confirm the piped image
+PIPING_TIMEOUT = float(os.environ.get("ALEKPET_PAINTER_PIPING_TIMEOUT", 4.0))
+
+
+class CanvasHandshake:
+    """Lets the executor thread wait until the server loop reports the canvas changed."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def reset(self):
+        self._event.clear()
+
+    def resolve(self):
+        self._event.set()
+
+    def wait(self, timeout=PIPING_TIMEOUT):
+        changed = self._event.wait(timeout)
+        self._event.clear()
+        return changed
+
+
+PAINTER_DICT = {}  # Painter nodes canvas handshakes
+PAINTER_DICT_LOCK = threading.Lock()
+
+
+def get_canvas_handshake(unique_id):
+    with PAINTER_DICT_LOCK:
+        if unique_id not in PAINTER_DICT:
+            PAINTER_DICT[unique_id] = CanvasHandshake()
+        return PAINTER_DICT[unique_id]
+
+
+# "url" writes piped images to the temp folder and sends /view URLs, "base64" sends data URLs
+PIPING_MODE = os.environ.get("ALEKPET_PAINTER_PIPING_MODE", "url")
+PIPING_FORMAT = os.environ.get("ALEKPET_PAINTER_PIPING_FORMAT", "png")
+PIPING_COMPRESS_LEVEL = 1
+PIPING_SUBFOLDER = "painter_piping"
+PIPED_FILES = {}  # Temp files of the last piped batch per node
+
+
+def toBase64ImgUrl(buffer, image_format=PIPING_FORMAT):
+    img_base64 = base64.b64encode(buffer.getvalue())
+    return f"data:image/{image_format};base64,{img_base64.decode('utf-8')}"
 
 
-def toBase64ImgUrl(img):
-    bytesIO = BytesIO()
-    img.save(bytesIO, format="PNG")
-    img_types = bytesIO.getvalue()
-    img_base64 = base64.b64encode(img_types)
-    return f"data:image/png;base64,{img_base64.decode('utf-8')}"
+def encodePipingImages(images):
+    return encode_images(images, PIPING_FORMAT, PIPING_COMPRESS_LEVEL, max_workers=os.cpu_count())
+
+
+def pipeImagesToTemp(unique_id, images):
+    """Write the batch to the temp folder and return the /view URLs, replacing the node's previous batch."""
+    temp_dir = os.path.join(folder_paths.get_temp_directory(), PIPING_SUBFOLDER)
+    os.makedirs(temp_dir, exist_ok=True)
+
+    for path in PIPED_FILES.pop(unique_id, []):
+        if os.path.isfile(path):
+            os.remove(path)
+
+    token = uuid.uuid4().hex[:8]
+    paths = []
+    urls = []
+    for index, buffer in enumerate(encodePipingImages(images)):
+        filename = f"painter_{unique_id}_{token}_{index}.{PIPING_FORMAT}"
+        path = os.path.join(temp_dir, filename)
+        with open(path, "wb") as f:
+            f.write(buffer.getbuffer())
+        paths.append(path)
+        urls.append("/view?" + urlencode({"filename": filename, "subfolder": PIPING_SUBFOLDER, "type": "temp"}))
+
+    PIPED_FILES[unique_id] = paths
+    return urls
 
 
 @PromptServer.instance.routes.post("/alekpet/check_canvas_changed")
@@ -202,26 +285,12 @@ async def check_canvas_changed(request):
     is_ok = json_data.get("is_ok", False)
 
     if unique_id is not None and unique_id in PAINTER_DICT and is_ok == True:
-        PAINTER_DICT[unique_id].canvas_set = True
+        PAINTER_DICT[unique_id].resolve()
         return web.json_response({"status": "Ok"})
 
     return web.json_response({"status": "Error"})
 
 
-async def wait_canvas_change(unique_id, time_out=40):
-    for _ in range(time_out):
-        if (
-            hasattr(PAINTER_DICT[unique_id], "canvas_set")
-            and PAINTER_DICT[unique_id].canvas_set == True
-        ):
-            PAINTER_DICT[unique_id].canvas_set = False
-            return True
-
-        await asyncio.sleep(0.1)
-
-    return False
-
-
 # end - Piping image
 
 
@@ -229,17 +298,11 @@ class PainterNode(object):
 
     @classmethod
     def INPUT_TYPES(self):
-        self.canvas_set = False
-
         work_dir = folder_paths.get_input_directory()
-        imgs = [
-            img
-            for img in os.listdir(work_dir)
-            if os.path.isfile(os.path.join(work_dir, img))
-        ]
+        imgs = list_files(work_dir)
 
         return {
-            "required": {"image": (sorted(imgs),)},
+            "required": {"image": (imgs,)},
             "hidden": {"unique_id": "UNIQUE_ID"},
             "optional": {"images": ("IMAGE",), "update_node": (([True, False],))},
         }
@@ -251,51 +314,33 @@ class PainterNode(object):
 
     def painter_execute(self, image, unique_id, update_node=True, images=None):
         # Piping image input
-        if unique_id not in PAINTER_DICT:
-            PAINTER_DICT[unique_id] = self
+        handshake = get_canvas_handshake(unique_id)
 
         if update_node == True and images is not None:
 
-            input_images = []
-
-            for imgs in images:
-                i = 255.0 * imgs.cpu().numpy()
-                i = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-                input_images.append(toBase64ImgUrl(i))
+            if PIPING_MODE == "url":
+                input_images = pipeImagesToTemp(unique_id, images)
+            else:
+                input_images = [toBase64ImgUrl(buffer) for buffer in encodePipingImages(images)]
 
-            PAINTER_DICT[unique_id].canvas_set = False
+            handshake.reset()
 
             PromptServer.instance.send_sync(
                 "alekpet_get_image", {"unique_id": unique_id, "images": input_images}
             )
-            if not asyncio.run(wait_canvas_change(unique_id)):
+            if not handshake.wait(PIPING_TIMEOUT):
                 print(f"Painter_{unique_id}: Failed to get image!")
             else:
                 print(f"Painter_{unique_id}: Image received, canvas changed!")
         # end - Piping image input
 
         image_path = folder_paths.get_annotated_filepath(image)
-
-        i = Image.open(image_path)
-        i = ImageOps.exif_transpose(i)
-        image = i.convert("RGB")
-        image = np.array(image).astype(np.float32) / 255.0
-        image = torch.from_numpy(image)[None,]
-        if "A" in i.getbands():
-            mask = np.array(i.getchannel("A")).astype(np.float32) / 255.0
-            mask = 1.0 - torch.from_numpy(mask)
-        else:
-            mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
-        return (image, mask.unsqueeze(0))
+        return load_image_tensors(image_path)
 
     @classmethod
     def IS_CHANGED(self, image, unique_id, update_node=True, images=None):
         image_path = folder_paths.get_annotated_filepath(image)
-        m = hashlib.sha256()
-        with open(image_path, "rb") as f:
-            m.update(f.read())
-
-        return m.digest().hex()
+        return file_fingerprint(image_path)
 
     @classmethod
     def VALIDATE_INPUTS(self, image, unique_id, update_node=True, images=None):
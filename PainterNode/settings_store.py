@@ -0,0 +1,240 @@
+import atexit
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+
+from .json_patch import apply_patch
+
+# Seconds a save waits before being written, later saves of the same node replace it
+WRITE_DELAY = 0.5
+EMPTY_SETTINGS = b"{}"
+# Settings larger than this are stored gzip-compressed as <name><suffix>.gz, 0 disables
+GZIP_THRESHOLD = int(os.environ.get("ALEKPET_PAINTER_SETTINGS_GZIP_BYTES", 1024 * 1024))
+GZIP_SUFFIX = ".gz"
+
+
+class RevisionMismatch(Exception):
+    def __init__(self, name, revision):
+        super().__init__(f"Settings '{name}' are at revision {revision}")
+        self.revision = revision
+
+
+class SettingsStore:
+    """
+    In-memory copy of the painter node settings files with write-behind.
+
+    Every ``<name><suffix>`` file is read once by ``ensure_loaded``; after
+    that reads are served from memory and saves only update memory and mark
+    the node dirty. A background writer persists dirty nodes after
+    ``WRITE_DELAY`` seconds (temp file + fsync + rename), so rapid saves of
+    the same node coalesce into one write, a crash never leaves a truncated
+    file and request handlers never touch the disk. Settings above
+    ``gzip_threshold`` bytes are stored gzip-compressed.
+
+    Every change gives the node a new revision ``"<epoch>:<n>"``, with a
+    per-process epoch and one counter for all nodes, so a revision is never
+    reused: not after a restart, nor by a node removed and created again.
+    ``patch`` applies a JSON patch against a known revision to the parsed
+    document and only serializes it again when it is read or written out.
+    """
+
+    def __init__(self, path, suffix, write_delay=WRITE_DELAY, gzip_threshold=GZIP_THRESHOLD):
+        self.path = path
+        self.suffix = suffix
+        self.write_delay = write_delay
+        self.gzip_threshold = gzip_threshold
+        self._lock = threading.Condition()
+        self._loaded = False
+        self._data = {}  # name -> raw JSON bytes, None while only _docs is current
+        self._docs = {}  # name -> parsed document, kept for patched nodes
+        self._revisions = {}
+        self._epoch = uuid.uuid4().hex[:12]
+        self._counter = 0
+        self._dirty = set()
+        self._writer = None
+        self._write_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def file_path(self, name):
+        return os.path.join(self.path, name + self.suffix)
+
+    def ensure_loaded(self):
+        """Read every settings file into memory, once; call off the event loop."""
+        with self._lock:
+            if self._loaded:
+                return
+            files = glob.glob("*" + self.suffix, root_dir=self.path)
+            files += glob.glob("*" + self.suffix + GZIP_SUFFIX, root_dir=self.path)
+            for file in files:
+                compressed = file.endswith(GZIP_SUFFIX)
+                name = file[: -len(self.suffix + GZIP_SUFFIX if compressed else self.suffix)]
+                try:
+                    with open(os.path.join(self.path, file), "rb") as f:
+                        raw = f.read()
+                    if compressed:
+                        raw = gzip.decompress(raw)
+                    json.loads(raw)
+                except Exception as e:
+                    print(f"Error load json file {file}: {e}, resetting it!")
+                    raw = EMPTY_SETTINGS
+                    self._dirty.add(name)
+                self._data[name] = raw
+                self._revisions[name] = self._new_revision()
+            self._loaded = True
+            self._start_writer()
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="painter-settings-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._data
+
+    def _raw(self, name):
+        raw = self._data[name]
+        if raw is None:
+            raw = self._data[name] = json.dumps(self._docs[name]).encode("utf-8")
+        return raw
+
+    def get(self, name, create=True):
+        """Raw JSON bytes for ``name``; missing nodes get empty settings when ``create`` is set."""
+        return self.get_revision(name, create)[0]
+
+    def get_revision(self, name, create=True):
+        """``(raw JSON bytes, revision)`` for ``name``, ``(None, None)`` when missing and not created."""
+        with self._lock:
+            if name not in self._data:
+                if not create:
+                    return None, None
+                print(f"File settings for '{name}' is not found! Create file!")
+                self._set(name, EMPTY_SETTINGS)
+            return self._raw(name), self._revisions[name]
+
+    def items(self, pattern_prefix=""):
+        with self._lock:
+            return [(name, self._raw(name)) for name in sorted(self._data) if name.startswith(pattern_prefix)]
+
+    def save(self, name, raw):
+        """Replace the settings of ``name`` and return the new revision."""
+        with self._lock:
+            return self._set(name, raw)
+
+    def _new_revision(self):
+        self._counter += 1
+        return f"{self._epoch}:{self._counter}"
+
+    def _set(self, name, raw, doc=None):
+        self._data[name] = raw
+        if doc is None:
+            self._docs.pop(name, None)
+        else:
+            self._docs[name] = doc
+        revision = self._revisions[name] = self._new_revision()
+        self._mark_dirty(name)
+        return revision
+
+    def patch(self, name, revision, operations):
+        """
+        Apply a JSON patch made against ``revision`` and return the new revision.
+
+        Raises ``KeyError`` for unknown nodes, ``RevisionMismatch`` when the
+        settings changed since ``revision`` (the client should send a full
+        save) and ``JsonPatchError`` for patches that don't apply. Parsing and
+        patching run outside the lock; call off the event loop.
+        """
+        with self._lock:
+            if name not in self._data:
+                raise KeyError(name)
+            if revision != self._revisions[name]:
+                raise RevisionMismatch(name, self._revisions[name])
+            doc = self._docs.get(name)
+            raw = self._data[name]
+
+        if doc is None:
+            doc = json.loads(raw)
+        doc = apply_patch(doc, operations)
+
+        with self._lock:
+            if name not in self._data or revision != self._revisions[name]:
+                raise RevisionMismatch(name, self._revisions.get(name))
+            return self._set(name, None, doc)
+
+    def remove(self, name):
+        """Forget ``name`` and delete its file in the background; False if it didn't exist."""
+        with self._lock:
+            if name not in self._data:
+                return False
+            del self._data[name]
+            self._docs.pop(name, None)
+            self._revisions.pop(name, None)
+            self._mark_dirty(name)
+            return True
+
+    def _mark_dirty(self, name):
+        self._dirty.add(name)
+        self._lock.notify_all()
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while not self._dirty:
+                    self._lock.wait()
+            # Let rapid saves coalesce before writing
+            time.sleep(self.write_delay)
+            self._write_dirty()
+
+    def _write_dirty(self):
+        with self._write_lock:
+            with self._lock:
+                # Patched documents are serialized below, outside the lock;
+                # patches never mutate a document so sharing it is safe
+                pending = {
+                    name: self._data[name] if self._data.get(name) is not None else self._docs.get(name)
+                    for name in self._dirty
+                }
+                self._dirty.clear()
+            for name, raw in pending.items():
+                try:
+                    if raw is not None and not isinstance(raw, bytes):
+                        raw = json.dumps(raw).encode("utf-8")
+                    self._write(name, raw)
+                except Exception as e:
+                    print(f"Error save json file {name}: {e}")
+                    with self._lock:
+                        self._dirty.add(name)
+
+    def _write(self, name, raw):
+        file_path = self.file_path(name)
+        compress = raw is not None and self.gzip_threshold and len(raw) > self.gzip_threshold
+        target, stale = (file_path + GZIP_SUFFIX, file_path) if compress else (file_path, file_path + GZIP_SUFFIX)
+
+        if raw is not None:
+            tmp_path = target + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(raw, compresslevel=6) if compress else raw)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+        else:
+            stale = None
+            for path in (file_path, file_path + GZIP_SUFFIX):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+        # Only one of the plain / compressed files may exist for a node
+        if stale is not None and os.path.isfile(stale):
+            os.remove(stale)
+
+    def flush(self):
+        """Write all pending changes now."""
+        self._write_dirty()
@@ -1,7 +1,13 @@
 # Title: ComfyUI Install Customs Nodes and javascript files
 # Author: AlekPet
 # Version: 2024.08.08
+from .startup_timing import StartupTimer
+
+# Set GENERA_STARTUP_TIMING to report where the package import spends its time
+startup_timer = StartupTimer()
+
 import os
+import importlib.metadata
 import importlib.util
 import subprocess
 import sys
@@ -14,6 +20,8 @@ import threading
 import ast
 from concurrent.futures import ThreadPoolExecutor
 
+from .asset_sync import sync_assets
+
 python = sys.executable
 
 # User extension files in custom_nodes
@@ -35,7 +43,8 @@ DEBUG = False
 # NODE_DISPLAY_NAME_MAPPINGS = dict()  # dynamic display names nodes append mappings names
 
 humanReadableTextReg = re.compile("(?<=[a-z0-9])([A-Z])|(?<=[A-Z0-9])([A-Z][a-z]+)")
-module_name_cut_version = re.compile("[>=<]")
+module_name_cut_version = re.compile("[>=<~!;\\[]")
+distribution_name_separators = re.compile("[-_.]+")
 
 installed_modules = {}
 # installed_modules = {m[1] for m in pkgutil.iter_modules()}
@@ -171,14 +180,17 @@ def module_install(commands, cwd="."):
     return result.wait()
 
 
+def normalize_module_name(name):
+    return distribution_name_separators.sub("-", name).lower()
+
+
 def get_installed_modules():
-    result = subprocess.run(
-        [sys.executable, "-m", "pip", "list", "--format=freeze"],
-        capture_output=True,
-        text=True,
-        check=True,
-    )
-    return {line.split("==")[0].lower() for line in result.stdout.splitlines()}
+    # Read the installed distributions in-process instead of running "pip list"
+    return {
+        normalize_module_name(dist.metadata["Name"])
+        for dist in importlib.metadata.distributions()
+        if dist.metadata["Name"]
+    }
 
 
 def checkModules(nodeElement):
@@ -187,12 +199,16 @@ def checkModules(nodeElement):
         log("  -> File 'requirements.txt' found!")
         with open(file_requir) as f:
             required_modules = {
-                module_name_cut_version.split(line.strip())[0]
+                module_name_cut_version.split(line.strip())[0].strip()
                 for line in f
-                if not line.startswith("#")
+                if line.strip() and not line.startswith("#")
             }
 
-        modules_to_install = required_modules - installed_modules
+        modules_to_install = {
+            module
+            for module in required_modules
+            if normalize_module_name(module) not in installed_modules
+        }
 
         if modules_to_install:
             module_install(
@@ -200,20 +216,21 @@ def checkModules(nodeElement):
             )
 
 
-def install_node(nodeElement):
-    log(f"* Node <{nodeElement}> is found, installing...")
-    web_extensions_dir = os.path.join(extension_folder, extension_dirs[0])
-
+def node_web_sources(nodeElement):
+    # (folder in the node, folder in web_alekpet_nodes); js files go to the root
     extensions_dirs_copy = ["js", "css", "assets", "lib", "fonts"]
+    sources = []
     for dir_name in extensions_dirs_copy:
         folder_curr = os.path.join(extension_folder, nodeElement, dir_name)
         if os.path.exists(folder_curr):
-            folder_curr_dist = os.path.join(
-                web_extensions_dir,
-                dir_name,
-                nodeElement.lower() if dir_name != "js" else web_extensions_dir,
+            sources.append(
+                (folder_curr, os.path.join(dir_name, nodeElement.lower()) if dir_name != "js" else "")
             )
-            shutil.copytree(folder_curr, folder_curr_dist, dirs_exist_ok=True)
+    return sources
+
+
+def install_node(nodeElement):
+    log(f"* Node <{nodeElement}> is found, installing...")
 
     clsNodes = getNamesNodesInsidePyFile(nodeElement)
     clsNodesText = "\033[93m" + ", ".join(clsNodes) + "\033[0m" if clsNodes else ""
@@ -240,14 +257,10 @@ def installNodes():
     if os.path.exists(oldDirNodes):
         shutil.rmtree(oldDirNodes)
 
-    # Clear folder web_alekpet_nodes
-    web_extensions_dir = os.path.join(extension_folder, extension_dirs[0])
-    if os.path.exists(web_extensions_dir):
-        shutil.rmtree(web_extensions_dir)
-
     checkFolderIsset()
 
-    installed_modules = get_installed_modules()
+    with startup_timer.phase("dependency_check"):
+        installed_modules = get_installed_modules()
 
     nodes = [
         nodeElement
@@ -257,7 +270,16 @@ def installNodes():
         and os.path.isdir(os.path.join(extension_folder, nodeElement))
     ]
 
-    with ThreadPoolExecutor() as executor:
+    # Copy only the web files changed since the last start, remove stale ones
+    web_extensions_dir = os.path.join(extension_folder, extension_dirs[0])
+    with startup_timer.phase("asset_sync"):
+        copied, removed = sync_assets(
+            [source for nodeElement in nodes for source in node_web_sources(nodeElement)],
+            web_extensions_dir,
+        )
+    log(f"* Web files synced: {copied} copied, {removed} removed")
+
+    with startup_timer.phase("install_nodes"), ThreadPoolExecutor() as executor:
         executor.map(install_node, nodes)
 
     printColorInfo(f"### [END] ComfyUI AlekPet Nodes ###", "\033[1;35m")
@@ -270,22 +292,29 @@ WEB_DIRECTORY = f"./{extension_dirs[0]}"
 # Install nodes
 installNodes()
 
-from .gcp_storage import NODE_CLASS_MAPPINGS as GCP_NODE_CLASS_MAPPINGS
-from .gcp_storage import NODE_DISPLAY_NAME_MAPPINGS as GCP_NODE_DISPLAY_NAME_MAPPINGS
+# Phases that register server routes report how many in the timing report
+with startup_timer.phase("import gcp_storage"):
+    from .gcp_storage import NODE_CLASS_MAPPINGS as GCP_NODE_CLASS_MAPPINGS
+    from .gcp_storage import NODE_DISPLAY_NAME_MAPPINGS as GCP_NODE_DISPLAY_NAME_MAPPINGS
 
-from .batch_tester import NODE_CLASS_MAPPINGS as BATCH_TESTER_NODE_CLASS_MAPPINGS
-from .batch_tester import NODE_DISPLAY_NAME_MAPPINGS as BATCH_TESTER_NODE_DISPLAY_NAME_MAPPINGS
+with startup_timer.phase("import batch_tester"):
+    from .batch_tester import NODE_CLASS_MAPPINGS as BATCH_TESTER_NODE_CLASS_MAPPINGS
+    from .batch_tester import NODE_DISPLAY_NAME_MAPPINGS as BATCH_TESTER_NODE_DISPLAY_NAME_MAPPINGS
 
-from .batch_previewer import NODE_CLASS_MAPPINGS as BATCH_PREVIEWER_NODE_CLASS_MAPPINGS
-from .batch_previewer import NODE_DISPLAY_NAME_MAPPINGS as BATCH_PREVIEWER_NODE_DISPLAY_NAME_MAPPINGS
+with startup_timer.phase("import batch_previewer"):
+    from .batch_previewer import NODE_CLASS_MAPPINGS as BATCH_PREVIEWER_NODE_CLASS_MAPPINGS
+    from .batch_previewer import NODE_DISPLAY_NAME_MAPPINGS as BATCH_PREVIEWER_NODE_DISPLAY_NAME_MAPPINGS
 
-from .utils import NODE_CLASS_MAPPINGS as UTILS_NODE_CLASS_MAPPINGS
-from .utils import NODE_DISPLAY_NAME_MAPPINGS as UTILS_NODE_DISPLAY_NAME_MAPPINGS
+with startup_timer.phase("import utils"):
+    from .utils import NODE_CLASS_MAPPINGS as UTILS_NODE_CLASS_MAPPINGS
+    from .utils import NODE_DISPLAY_NAME_MAPPINGS as UTILS_NODE_DISPLAY_NAME_MAPPINGS
 
-from .mask_drawer import NODE_CLASS_MAPPINGS as MASK_DRAWER_NODE_CLASS_MAPPINGS
-from .mask_drawer import NODE_DISPLAY_NAME_MAPPINGS as MASK_DRAWER_NODE_DISPLAY_NAME_MAPPINGS
+with startup_timer.phase("import mask_drawer"):
+    from .mask_drawer import NODE_CLASS_MAPPINGS as MASK_DRAWER_NODE_CLASS_MAPPINGS
+    from .mask_drawer import NODE_DISPLAY_NAME_MAPPINGS as MASK_DRAWER_NODE_DISPLAY_NAME_MAPPINGS
 
-from .PainterNode.painter_node import PainterNode
+with startup_timer.phase("import painter_node"):
+    from .PainterNode.painter_node import PainterNode
 
 NODE_CLASS_MAPPINGS = {**GCP_NODE_CLASS_MAPPINGS,
                        **BATCH_TESTER_NODE_CLASS_MAPPINGS,
@@ -301,8 +330,10 @@ NODE_DISPLAY_NAME_MAPPINGS = {**GCP_NODE_DISPLAY_NAME_MAPPINGS,
                               **MASK_DRAWER_NODE_DISPLAY_NAME_MAPPINGS,
                               "PainterNode": "Painter Node"}
 
+startup_timer.finish()
+
 # WEB_DIRECTORY = "./js"
 
 # __all__ = ['NODE_CLASS_MAPPINGS',
 #            'NODE_DISPLAY_NAME_MAPPINGS',
-#            'WEB_DIRECTORY']
\ No newline at end of file
+#            'WEB_DIRECTORY']
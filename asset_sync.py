@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = ".asset_manifest.json"
+
+
+def walk_files(path):
+    """``{relative path: (size, mtime_ns)}`` of every file below ``path``."""
+    files = {}
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(path, rel_dir)) as entries:
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name)
+                if entry.is_dir():
+                    stack.append(rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files[rel] = (st.st_size, st.st_mtime_ns)
+    return files
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {rel: tuple(value) for rel, value in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def sync_assets(sources, dest, max_workers=8):
+    """
+    Make ``dest`` hold exactly the files of ``sources``, copying only what changed.
+
+    ``sources`` is a list of ``(source dir, destination subdir)`` pairs. A
+    manifest in ``dest`` records the source ``(size, mtime_ns)`` of every
+    copied file, so an unchanged install costs one directory walk of the
+    sources instead of deleting and re-copying everything. Files in
+    ``dest`` that no source provides any more are removed. Returns
+    ``(copied, removed)`` counts.
+    """
+    wanted = {}
+    for src_dir, dest_subdir in sources:
+        for rel, stat in walk_files(src_dir).items():
+            wanted[os.path.normpath(os.path.join(dest_subdir, rel))] = (os.path.join(src_dir, rel), stat)
+
+    manifest_path = os.path.join(dest, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    present = walk_files(dest) if os.path.isdir(dest) else {}
+    present.pop(MANIFEST_NAME, None)
+
+    to_copy = [
+        (src, os.path.join(dest, rel))
+        for rel, (src, stat) in wanted.items()
+        if rel not in present or manifest.get(rel) != stat
+    ]
+    to_remove = [os.path.join(dest, rel) for rel in present if rel not in wanted]
+
+    for path in to_remove:
+        os.remove(path)
+    for dir_path in {os.path.dirname(dst) for _, dst in to_copy}:
+        os.makedirs(dir_path, exist_ok=True)
+    if to_copy:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda pair: shutil.copy2(*pair), to_copy))
+
+    # Drop directories emptied by removals, deepest first
+    for dir_path in sorted({os.path.dirname(path) for path in to_remove}, key=len, reverse=True):
+        while dir_path != dest and os.path.isdir(dir_path) and not os.listdir(dir_path):
+            os.rmdir(dir_path)
+            dir_path = os.path.dirname(dir_path)
+
+    if to_copy or to_remove or manifest.keys() != wanted.keys():
+        os.makedirs(dest, exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({rel: list(stat) for rel, (_, stat) in wanted.items()}, f)
+        os.replace(tmp_path, manifest_path)
+
+    return len(to_copy), len(to_remove)
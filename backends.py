@@ -0,0 +1,347 @@
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from .gcp_clients import config_file_path, get_bucket, load_credentials
+from .job_publisher import BATCH_MAX_BYTES, BATCH_MAX_LATENCY, BATCH_MAX_MESSAGES
+
+# Storage and job transport used by the Genera nodes: "gcp" (GCS + Pub/Sub),
+# "local" (files under LOCAL_STORAGE_DIR, in-process jobs) or "memory" (all in-process)
+BACKENDS = ["gcp", "local", "memory"]
+DEFAULT_BACKEND = os.environ.get("GENERA_BACKEND", "gcp")
+LOCAL_STORAGE_DIR = os.environ.get(
+    "GENERA_LOCAL_STORAGE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_storage"))
+# Deliveries of a nacked in-process message before it is dropped
+MAX_DELIVERY_ATTEMPTS = 5
+# Messages kept per in-process subscription before new ones are dropped
+MAX_QUEUED_MESSAGES = 1000
+# Result URI schemes read straight from a store on each backend, anything else must be HTTP(S)
+RESULT_URI_SCHEMES = {"gcp": (), "local": ("file",), "memory": ("memory",)}
+
+
+# Blob stores: put / put_file / get / exists / uri on one bucket, ``location``
+# identifies the bucket across backends (a bucket name can exist on several)
+
+class GCSBlobStore:
+    """Blobs in a GCS bucket; the client is created on first use."""
+
+    persistent = True
+
+    def __init__(self, bucket_name, credentials_path=config_file_path):
+        self.name = bucket_name
+        self.location = f"gs://{bucket_name}"
+        self.credentials_path = credentials_path
+
+    @property
+    def bucket(self):
+        return get_bucket(self.name, self.credentials_path)
+
+    def put(self, object_name, data, content_type=None, size=None, chunk_size=None):
+        """Upload ``data``, bytes or a binary file object read from its current position."""
+        blob = self.bucket.blob(object_name)
+        if chunk_size is not None:
+            blob.chunk_size = chunk_size
+        if isinstance(data, (bytes, bytearray)):
+            blob.upload_from_string(bytes(data), content_type=content_type)
+        else:
+            blob.upload_from_file(data, size=size, content_type=content_type)
+
+    def put_file(self, object_name, path, content_type=None):
+        self.bucket.blob(object_name).upload_from_filename(path, content_type=content_type)
+
+    def get(self, object_name):
+        return self.bucket.blob(object_name).download_as_bytes()
+
+    def exists(self, object_name):
+        return self.bucket.blob(object_name).exists()
+
+    def uri(self, object_name):
+        return f"gs://{self.name}/{object_name}"
+
+
+class LocalBlobStore:
+    """Blobs as files under ``<root>/<bucket name>/``, written atomically."""
+
+    persistent = True
+
+    def __init__(self, bucket_name, root=LOCAL_STORAGE_DIR):
+        self.name = bucket_name
+        self.path = os.path.join(os.path.abspath(root), bucket_name)
+        self.location = "file://" + self.path
+
+    def _path(self, object_name):
+        path = os.path.normpath(os.path.join(self.path, object_name))
+        if not path.startswith(self.path + os.sep):
+            raise ValueError(f"Object name escapes the bucket: {object_name}")
+        return path
+
+    def _write(self, object_name, write):
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put(self, object_name, data, content_type=None, size=None, chunk_size=None):
+        if isinstance(data, (bytes, bytearray)):
+            self._write(object_name, lambda f: f.write(data))
+        else:
+            self._write(object_name, lambda f: shutil.copyfileobj(data, f, chunk_size or 1024 * 1024))
+
+    def put_file(self, object_name, path, content_type=None):
+        with open(path, "rb") as f:
+            self.put(object_name, f)
+
+    def get(self, object_name):
+        with open(self._path(object_name), "rb") as f:
+            return f.read()
+
+    def exists(self, object_name):
+        return os.path.isfile(self._path(object_name))
+
+    def uri(self, object_name):
+        return "file://" + self._path(object_name)
+
+
+class MemoryBlobStore:
+    """Blobs in a dict, for tests and benchmarks in one process."""
+
+    # Gone with the process, upload caches must not remember what it holds
+    persistent = False
+
+    def __init__(self, bucket_name):
+        self.name = bucket_name
+        self.location = f"memory://{bucket_name}"
+        self._lock = threading.Lock()
+        self._blobs = {}
+
+    def put(self, object_name, data, content_type=None, size=None, chunk_size=None):
+        if not isinstance(data, (bytes, bytearray)):
+            data = data.read() if size is None else data.read(size)
+        with self._lock:
+            self._blobs[object_name] = bytes(data)
+
+    def put_file(self, object_name, path, content_type=None):
+        with open(path, "rb") as f:
+            self.put(object_name, f.read())
+
+    def get(self, object_name):
+        with self._lock:
+            return self._blobs[object_name]
+
+    def exists(self, object_name):
+        with self._lock:
+            return object_name in self._blobs
+
+    def uri(self, object_name):
+        return f"memory://{self.name}/{object_name}"
+
+
+# Job transports: publish(topic, data, **attributes) -> Future and
+# subscribe(subscription, callback) -> future with cancel() / done(),
+# the subset of the Pub/Sub publisher and subscriber the nodes use
+
+class PubSubTransport:
+    """Google Pub/Sub; the SDK and clients are loaded on first use."""
+
+    def __init__(self, credentials_path=config_file_path):
+        self.credentials_path = credentials_path
+        self._lock = threading.Lock()
+        self._publisher = None
+        self._subscriber = None
+
+    def _clients(self):
+        with self._lock:
+            if self._publisher is None:
+                from google.cloud import pubsub_v1
+
+                credentials = load_credentials(self.credentials_path)
+                self._publisher = pubsub_v1.PublisherClient(
+                    batch_settings=pubsub_v1.types.BatchSettings(
+                        max_messages=BATCH_MAX_MESSAGES,
+                        max_bytes=BATCH_MAX_BYTES,
+                        max_latency=BATCH_MAX_LATENCY,
+                    ),
+                    credentials=credentials)
+                self._subscriber = pubsub_v1.SubscriberClient(credentials=credentials)
+            return self._publisher, self._subscriber
+
+    def publish(self, topic, data, **attributes):
+        return self._clients()[0].publish(topic, data, **attributes)
+
+    def subscribe(self, subscription, callback):
+        return self._clients()[1].subscribe(subscription, callback=callback)
+
+
+class InProcessMessage:
+    def __init__(self, transport, subscription, data, attributes):
+        self._transport = transport
+        self._subscription = subscription
+        self.message_id = uuid.uuid4().hex
+        self.data = data
+        self.attributes = attributes
+        self.delivery_attempt = 1
+
+    def ack(self):
+        pass
+
+    def nack(self):
+        # Redelivered like an unacknowledged Pub/Sub message, dropped like a dead letter at the limit
+        if self.delivery_attempt >= MAX_DELIVERY_ATTEMPTS:
+            print(f"Dropping message {self.message_id} on {self._subscription} after {self.delivery_attempt} attempts")
+            return
+        self.delivery_attempt += 1
+        self._transport._enqueue(self._subscription, self)
+
+
+class InProcessSubscription:
+    """Delivers one subscription's queue to a callback on a small thread pool."""
+
+    def __init__(self, messages, callback, workers):
+        self._messages = messages
+        self._callback = callback
+        self._cancelled = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="in-process-subscriber")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._cancelled.is_set():
+            try:
+                message = self._messages.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if not self._cancelled.is_set():
+                try:
+                    self._executor.submit(self._callback, message)
+                    continue
+                except RuntimeError:
+                    # cancel() shut the executor down after the check
+                    pass
+            # Leave it for the next subscriber
+            try:
+                self._messages.put_nowait(message)
+            except queue.Full:
+                print(f"Dropping message {message.message_id}, its queue filled up while cancelling")
+            break
+
+    def cancel(self):
+        self._cancelled.set()
+        self._executor.shutdown(wait=False)
+
+    def done(self):
+        return self._cancelled.is_set()
+
+
+class InProcessTransport:
+    """
+    Topics and subscriptions inside this process.
+
+    Messages published to a topic are queued on every subscription in
+    ``routes[topic]`` (the subscription with the topic's own name when the
+    topic has no route) and kept until a subscriber takes them, like Pub/Sub
+    retention. Nothing outside the process can subscribe, so messages for a
+    subscription nobody opened yet are dropped, and each queue holds at
+    most ``max_queued`` messages.
+    """
+
+    def __init__(self, routes=None, workers=4, max_queued=MAX_QUEUED_MESSAGES):
+        self.routes = dict(routes or {})
+        self.workers = workers
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._subscribed = set()
+
+    def route(self, topic, subscription):
+        with self._lock:
+            self.routes.setdefault(topic, []).append(subscription)
+
+    def _queue(self, subscription):
+        with self._lock:
+            return self._queues.setdefault(subscription, queue.Queue(self.max_queued))
+
+    def _enqueue(self, subscription, message):
+        try:
+            self._queue(subscription).put_nowait(message)
+        except queue.Full:
+            print(f"Dropping message {message.message_id}, {subscription} already holds {self.max_queued} messages")
+
+    def publish(self, topic, data, **attributes):
+        with self._lock:
+            subscriptions = [subscription for subscription in self.routes.get(topic, [topic])
+                             if subscription in self._subscribed]
+        if not subscriptions:
+            print(f"Dropping message for {topic}, nothing in this process subscribes to it")
+        for subscription in subscriptions:
+            self._enqueue(subscription, InProcessMessage(self, subscription, data, attributes))
+        future = Future()
+        future.set_result(str(time.time_ns()))
+        return future
+
+    def subscribe(self, subscription, callback):
+        with self._lock:
+            self._subscribed.add(subscription)
+        return InProcessSubscription(self._queue(subscription), callback, self.workers)
+
+
+_stores = {}
+_transports = {}
+_backends_lock = threading.Lock()
+
+
+def get_blob_store(backend, bucket_name, credentials_path=config_file_path):
+    """Process-wide blob store for ``bucket_name`` on ``backend``."""
+    key = (backend, bucket_name, credentials_path)
+    with _backends_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "gcp":
+                store = GCSBlobStore(bucket_name, credentials_path)
+            elif backend == "local":
+                store = LocalBlobStore(bucket_name)
+            elif backend == "memory":
+                store = MemoryBlobStore(bucket_name)
+            else:
+                raise ValueError(f"Unknown backend: {backend}")
+            _stores[key] = store
+        return store
+
+
+def get_transport(backend, credentials_path=config_file_path):
+    """Process-wide job transport for ``backend``; "local" and "memory" share one in-process transport."""
+    key = ("gcp", credentials_path) if backend == "gcp" else ("in-process",)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+    with _backends_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = PubSubTransport(credentials_path) if backend == "gcp" else InProcessTransport()
+        return transport
+
+
+def read_uri(uri):
+    """Bytes of a ``file://`` or ``memory://`` blob written by the local backends."""
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        with open(unquote(parsed.path), "rb") as f:
+            return f.read()
+    if parsed.scheme == "memory":
+        with _backends_lock:
+            stores = [store for (backend, name, _), store in _stores.items()
+                      if backend == "memory" and name == parsed.netloc]
+        if not stores:
+            raise FileNotFoundError(uri)
+        return stores[0].get(parsed.path.lstrip("/"))
+    raise ValueError(f"Unsupported blob URI: {uri}")
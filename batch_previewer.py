@@ -1,17 +1,27 @@
-import json
 import os
 import uuid
 import logging
-from google.cloud import pubsub_v1
-from google.cloud import storage
-import requests
-import time
-from PIL import Image, ImageSequence, ImageOps
-import numpy as np
-import torch
-from io import BytesIO
 import folder_paths
 
+# Blocks the nodes connected to an output, in ComfyUI versions with lazy execution
+try:
+    from comfy_execution.graph_utils import ExecutionBlocker
+except ImportError:
+    try:
+        from comfy_execution.graph import ExecutionBlocker
+    except ImportError:
+        ExecutionBlocker = None
+
+from .backends import RESULT_URI_SCHEMES, get_blob_store, get_transport
+from .image_loader import pil_to_tensors
+from .job_publisher import JobPublisher
+from .job_registry import JobRegistry
+from .lora_cache import LoraUploadCache
+from .result_batch import SIZE_POLICIES, ResultBatch
+from .result_fetcher import ResultFetcher
+from .result_listener import get_result_listener
+from .workflow_template import WorkflowTemplate
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
@@ -19,47 +29,23 @@ workflow_file_path = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'space_preview_v4.json')
 config_file_path = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'gcp_config.json')
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = config_file_path
-
-
-def pil2tensor(img):
-    output_images = []
-    output_masks = []
-    for i in ImageSequence.Iterator(img):
-        i = ImageOps.exif_transpose(i)
-        if i.mode == 'I':
-            i = i.point(lambda i: i * (1 / 255))
-        image = i.convert("RGB")
-        image = np.array(image).astype(np.float32) / 255.0
-        image = torch.from_numpy(image)[None,]
-        if 'A' in i.getbands():
-            mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
-            mask = 1. - torch.from_numpy(mask)
-        else:
-            mask = torch.zeros((64, 64), dtype=torch.float32, device="cpu")
-        output_images.append(image)
-        output_masks.append(mask.unsqueeze(0))
-
-    if len(output_images) > 1:
-        output_image = torch.cat(output_images, dim=0)
-        output_mask = torch.cat(output_masks, dim=0)
-    else:
-        output_image = output_images[0]
-        output_mask = output_masks[0]
-
-    return (output_image, output_mask)
-
-
-def load_image(image_source):
-    if image_source.startswith('http'):
-        print(image_source)
-        response = requests.get(image_source)
-        img = Image.open(BytesIO(response.content))
-        file_name = image_source.split('/')[-1]
-    else:
-        img = Image.open(image_source)
-        file_name = os.path.basename(image_source)
-    return img, file_name
+
+lora_upload_cache = LoraUploadCache()
+
+# Workers only take jobs over Pub/Sub. The in-process "local" and "memory"
+# transports have no consumer in a ComfyUI session, so they are not offered
+# on the node and stay reachable through run_jobs(backend=...) for tests and benchmarks
+JOB_BACKEND = "gcp"
+
+# Loaded once, re-read only when the file changes
+workflow_template = WorkflowTemplate(workflow_file_path)
+
+
+def parse_seeds(seeds):
+    seed_numbers = [int(seed.strip())
+                    for seed in seeds.split(",") if seed.strip().isdigit()]
+    logging.info(f"Parsed seeds: {seed_numbers}")
+    return seed_numbers
 
 
 class BatchPreviewer:
@@ -78,6 +64,11 @@ class BatchPreviewer:
                 "lora_name": (folder_paths.get_filename_list("loras"), {"tooltip": "The name of the LoRA."}),
                 "strength_model": ("FLOAT", {"default": 1.0, "min": -100.0, "max": 100.0, "step": 0.01, "tooltip": "How strongly to modify the diffusion model. This value can be negative."}),
             },
+            "optional": {
+                "max_downloads": ("INT", {"default": 8, "min": 1, "max": 64, "tooltip": "Maximum number of result images downloaded in parallel."}),
+                "download_timeout": ("FLOAT", {"default": 30.0, "min": 1.0, "max": 600.0, "step": 1.0, "tooltip": "Timeout in seconds for a single result download."}),
+                "max_wait_time": ("INT", {"default": 300, "min": 1, "max": 3600, "tooltip": "Overall deadline in seconds for all results to arrive."}),
+            },
         }
 
     # Define each image individually
@@ -89,124 +80,187 @@ class BatchPreviewer:
 
     def __init__(self):
         logging.info("Initializing BatchPreviewer...")
-        self.publisher = pubsub_v1.PublisherClient()
-        self.subscriber = pubsub_v1.SubscriberClient()
         self.topic_name = "projects/genera-408110/topics/space-previewer"
         self.subscription_id = "projects/genera-408110/subscriptions/space-previewer-result-sub"
-        storage_client = storage.Client()
-        self.bucket = storage_client.bucket("space-previewer")
+        self.bucket_name = "space-previewer"
+        self.job_publishers = {}
+        self.fetcher = None
         logging.info("BatchPreviewer initialized successfully.")
 
-    def process(self, prompt, seeds, lora_name, strength_model):
-        logging.info("Processing job with prompt and seeds.")
-
+    def get_listener(self, backend):
+        return get_result_listener(get_transport(backend, config_file_path), self.subscription_id)
+
+    def get_job_publisher(self, backend):
+        job_publisher = self.job_publishers.get(backend)
+        if job_publisher is None:
+            job_publisher = JobPublisher(get_transport(backend, config_file_path), self.topic_name)
+            self.job_publishers[backend] = job_publisher
+        return job_publisher
+
+    def get_fetcher(self, max_downloads, download_timeout, backend=JOB_BACKEND):
+        uri_schemes = RESULT_URI_SCHEMES[backend]
+        if self.fetcher is None or not self.fetcher.matches(max_downloads, download_timeout, uri_schemes):
+            if self.fetcher is not None:
+                self.fetcher.close()
+            self.fetcher = ResultFetcher(max_in_flight=max_downloads,
+                                         timeout=download_timeout,
+                                         decode=pil_to_tensors,
+                                         uri_schemes=uri_schemes)
+        return self.fetcher
+
+    def run_jobs(self, prompt, seed_numbers, lora_name, strength_model, max_downloads, download_timeout, max_wait_time, on_image=None, backend=JOB_BACKEND):
+        """
+        Fan out one job per seed on ``backend`` and wait for the results.
+
+        Returns ``[(seed, image or None)]`` in seed order. If ``on_image`` is
+        given it is called as ``on_image(index, image)`` from the download
+        threads as each result is decoded, and the images are not collected.
+        """
+        fetcher = self.get_fetcher(max_downloads, download_timeout, backend)
+        listener = self.get_listener(backend)
+
+        # Content-addressed upload, the manifest skips unchanged LoRAs
         lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
-        # Destination in the bucket
-        destination_blob_name = f"loras/{lora_name}"
-        blob = self.bucket.blob(destination_blob_name)
-
-        # Check if the blob already exists
-        if not blob.exists():
-            # Upload the file if it does not exist
-            blob.upload_from_filename(lora_path)
-            print(f"File {lora_name} uploaded to {destination_blob_name}.")
-        else:
-            print(f"File {lora_name} already exists at {
-                  destination_blob_name}, skipping upload.")
-
-        # Parse seeds
-        seed_numbers = [int(seed.strip())
-                        for seed in seeds.split(",") if seed.strip().isdigit()]
-        logging.info(f"Parsed seeds: {seed_numbers}")
-
-        # Load workflow from JSON file
+        store = get_blob_store(backend, self.bucket_name, config_file_path)
+        remote_lora_name = lora_upload_cache.ensure_uploaded(store, lora_path)
+
+        # Load workflow template, cached until the file changes; one version for the whole fan-out
         try:
-            with open(workflow_file_path) as f:
-                base_workflow = json.load(f)
-            logging.info("Loaded base workflow successfully.")
+            template = workflow_template.snapshot()
         except Exception as e:
             logging.error(f"Error loading workflow: {e}")
-            return []
-
-        jobs = []
-        job_ids = set()
-
-        # Modify workflow per seed
-        for seed in seed_numbers:
-            workflow = base_workflow.copy()
-
-            if "530" in workflow:
-                workflow["530"]["inputs"]["text"] = prompt
-            if "81" in workflow:
-                workflow["81"]["inputs"]["noise_seed"] = seed
-            if "517" in workflow:
-                workflow["517"]["inputs"]["lora_name"] = lora_name
-                workflow["517"]["inputs"]["strength_model"] = strength_model
-            if "532" in workflow:
-                workflow["532"]["inputs"]["filename_prefix"] = str(uuid.uuid4())[
-                    :4]
-
-            job_id = str(uuid.uuid4())
-            job_ids.add(job_id)
-            job = {
-                "id": job_id,
-                "workflow": workflow,
-                "uploads": {"loras": [lora_name]},
-            }
-            jobs.append(job)
-
-            # Publish job to Pub/Sub
-            try:
-                message = json.dumps(job).encode("utf-8")
-                self.publisher.publish(self.topic_name, message, job_id=job_id)
-                logging.info(f"Published job with ID {job_id} to Pub/Sub.")
-            except Exception as e:
-                logging.error(f"Error publishing job {job_id}: {e}")
+            return [(seed, None) for seed in seed_numbers]
 
-        received_images = []
+        registry = JobRegistry()
+        job_indices = {}
 
-        def callback(message):
+        def on_download(job_id, future):
+            if on_image is None or future.exception() is not None:
+                registry.resolve_future(job_id, future)
+                return
+            # Hand the image over instead of keeping a second reference in the registry
             try:
-                data = json.loads(message.data.decode("utf-8"))
-                job_id = data["id"]
-                if job_id in job_ids:
-                    url = data["url"]
-
-                    img, name = load_image(url)
-                    img_out, mask_out = pil2tensor(img)
-                    received_images.append(img_out)
-
-                    message.ack()
-                    job_ids.remove(job_id)
-                else:
-                    message.ack()
-
+                on_image(job_indices[job_id], future.result()[0])
+                registry.resolve(job_id)
             except Exception as e:
-                logging.error(f"Error processing message: {e}")
-                message.nack()
+                registry.resolve(job_id, error=e)
+
+        def on_result(data):
+            job_id = data["id"]
+            if registry.claim(job_id):
+                # Only enqueue here, the fetcher downloads and decodes
+                future = fetcher.submit(data["url"])
+                future.add_done_callback(lambda f: on_download(job_id, f))
+
+        # Serialize the job once, only the patched fields differ per seed
+        uploads = {"loras": [remote_lora_name]}
+        messages = {}
+        late_results = []
+        for index, seed in enumerate(seed_numbers):
+            # What the job renders: a result that arrived after an earlier run gave up is reused
+            key = (prompt, seed, remote_lora_name, strength_model, template.version)
+            data = listener.take_cached(key)
+            if data is not None:
+                job_indices[data["id"]] = index
+                registry.add(data["id"])
+                late_results.append(data)
+                continue
 
-        # Listen for responses with timeout mechanism
-        streaming_pull_future = self.subscriber.subscribe(
-            self.subscription_id, callback=callback)
-        timeout = 5  # Time to wait between checks
-        max_wait_time = 300  # Total max wait time (adjust as needed)
-        elapsed_time = 0
+            job_id = str(uuid.uuid4())
+            job_indices[job_id] = index
+            messages[job_id] = template.encode_job(job_id, uploads, {
+                "prompt": prompt,
+                "seed": seed,
+                "lora_name": remote_lora_name,
+                "strength_model": strength_model,
+                "filename_prefix": str(uuid.uuid4())[:4],
+            })
+            registry.add(job_id)
+            listener.register(job_id, on_result, key)
+
+        if late_results:
+            logging.info(f"Reusing {len(late_results)} late results of earlier runs.")
+        for data in late_results:
+            on_result(data)
+
+        # Publish the whole fan-out and drop jobs that never made it to the transport
+        failed = self.get_job_publisher(backend).publish_all(messages)
+        for job_id, error in failed.items():
+            listener.unregister(job_id)
+            registry.resolve(job_id, error=error)
+
+        # The shared listener routes responses until every job is resolved or the deadline passes
+        logging.info(f"Listening for responses on the {backend} backend...")
+        if not registry.wait(timeout=max_wait_time):
+            logging.error(f"Timed out waiting for jobs: {registry.pending()}")
+
+        # Results arriving after this point are cached by the listener for the next run
+        for job_id in registry.pending():
+            listener.unregister(job_id, cache_late=True)
+
+        received_images = [None] * len(seed_numbers)
+        for job_id, (result, error) in registry.results().items():
+            if error is not None:
+                logging.error(f"Error downloading result for job {job_id}: {error}")
+                continue
+            if result is not None:
+                img_out, mask_out = result
+                received_images[job_indices[job_id]] = img_out
+
+        return list(zip(seed_numbers, received_images))
+
+    def process(self, prompt, seeds, lora_name, strength_model, max_downloads=8, download_timeout=30.0, max_wait_time=300, backend=JOB_BACKEND):
+        logging.info("Processing job with prompt and seeds.")
+        seed_numbers = parse_seeds(seeds)
+        results = self.run_jobs(prompt, seed_numbers[:len(self.RETURN_TYPES)], lora_name, strength_model,
+                                max_downloads, download_timeout, max_wait_time, backend=backend)
+
+        # Slot i is seed i; a missing result blocks its slot rather than shifting later seeds
+        missing = [seed for seed, image in results if image is None]
+        if missing and ExecutionBlocker is None:
+            raise RuntimeError(f"Batch Previewer: no result for seeds {', '.join(map(str, missing))}.")
+        outputs = [image if image is not None else ExecutionBlocker(f"Batch Previewer: no result for seed {seed}.")
+                   for seed, image in results]
+        # Slots without a seed block their consumers silently
+        outputs += [ExecutionBlocker(None) if ExecutionBlocker is not None else None] * (len(self.RETURN_TYPES) - len(outputs))
+        return tuple(outputs)
+
+
+class BatchPreviewerBatch(BatchPreviewer):
+    """
+    BatchPreviewer variant returning every result as one IMAGE batch in seed
+    order, plus the seeds that produced it.
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        input_types = super().INPUT_TYPES()
+        input_types["optional"]["size_mismatch"] = (SIZE_POLICIES, {"tooltip": "How results with a different resolution than the first one are fitted into the batch."})
+        return input_types
 
-        logging.info("Listening for responses from Pub/Sub...")
-        while job_ids and elapsed_time < max_wait_time:
-            time.sleep(timeout)
-            elapsed_time += timeout
+    RETURN_TYPES = ("IMAGE", "INT")
+    RETURN_NAMES = ("images", "seeds")
+    OUTPUT_IS_LIST = (False, True)
 
-        streaming_pull_future.cancel()  # Stop the subscription
+    def process(self, prompt, seeds, lora_name, strength_model, max_downloads=8, download_timeout=30.0, max_wait_time=300, size_mismatch="resize", backend=JOB_BACKEND):
+        logging.info("Processing batch job with prompt and seeds.")
+        seed_numbers = parse_seeds(seeds)
+        batch = ResultBatch(len(seed_numbers), policy=size_mismatch)
+        self.run_jobs(prompt, seed_numbers, lora_name, strength_model,
+                      max_downloads, download_timeout, max_wait_time, on_image=batch.put, backend=backend)
 
-        # Return images separately for compatibility
-        return tuple(received_images)
+        images = batch.images()
+        if images is None:
+            raise RuntimeError("Batch Previewer: no results received.")
+        return (images, [seed_numbers[i] for i in batch.filled()])
 
 
 NODE_CLASS_MAPPINGS = {
     "Genera.BatchPreviewer": BatchPreviewer,
+    "Genera.BatchPreviewerBatch": BatchPreviewerBatch,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "Genera.BatchPreviewer": "Batch Previewer",
+    "Genera.BatchPreviewerBatch": "Batch Previewer (Batch)",
 }
@@ -0,0 +1,271 @@
+"""
+End-to-end benchmark of the BatchPreviewer fan-out / fan-in loop on the
+in-process "memory" backend.
+
+A simulated worker answers every job after a configurable latency and
+jitter, and serves the result PNGs from a local HTTP server; jobs can be
+lost and downloads can fail at configurable rates. Each seed count runs in
+its own subprocess so peak RSS is per configuration. Reported per seed
+count (median of the repeats): time to first and last image, peak RSS and
+the upload / publish / wait phases plus download / decode time summed over
+the jobs.
+
+Needs the ComfyUI modules (folder_paths, node_helpers) importable: run from
+the ComfyUI root or pass --comfyui.
+
+    python benchmarks/bench_batch_previewer.py [--seeds 4 16 64 256] [--latency 0.5] [--jitter 0.2]
+        [--size 512] [--loss-rate 0] [--http-error-rate 0] [--repeat 3] [--json report.json]
+"""
+import argparse
+import importlib
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ["upload", "publish", "wait", "download", "decode"]
+
+
+def load_nodes(comfyui_path):
+    """Import batch_previewer as part of the node package without running its installer."""
+    if comfyui_path:
+        sys.path.insert(0, comfyui_path)
+    package = types.ModuleType("genera_nodes")
+    package.__path__ = [ROOT]
+    sys.modules["genera_nodes"] = package
+    return importlib.import_module("genera_nodes.batch_previewer")
+
+
+def make_png(size, seed=0):
+    from PIL import Image
+
+    # Noise compresses like a real render would not, so sizes stay honest
+    img = Image.frombytes("RGB", (size, size), random.Random(seed).randbytes(size * size * 3))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class ResultServer:
+    """Serves the same PNG for every ``/<job id>.png``, failing a share of requests with 500."""
+
+    def __init__(self, png, error_rate):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if random.random() < server.error_rate:
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(server.png)))
+                self.end_headers()
+                self.wfile.write(server.png)
+
+            def log_message(self, *args):
+                pass
+
+        self.png = png
+        self.error_rate = error_rate
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, job_id):
+        return f"http://127.0.0.1:{self.httpd.server_port}/{job_id}.png"
+
+
+class SimulatedWorker:
+    """Answers jobs from the job topic on the result subscription after latency +- jitter."""
+
+    def __init__(self, transport, topic, subscription, server, latency, jitter, loss_rate):
+        self.transport = transport
+        self.subscription = subscription
+        self.server = server
+        self.latency = latency
+        self.jitter = jitter
+        self.loss_rate = loss_rate
+        self.future = transport.subscribe(topic, self.on_job)
+
+    def on_job(self, message):
+        job_id = json.loads(message.data)["id"]
+        message.ack()
+        if random.random() < self.loss_rate:
+            return
+        delay = max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+        timer = threading.Timer(delay, self.answer, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+
+    def answer(self, job_id):
+        data = json.dumps({"id": job_id, "url": self.server.url(job_id)}).encode("utf-8")
+        self.transport.publish(self.subscription, data)
+
+
+class PhaseTimes:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+    def timed(self, phase, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.totals[phase] += time.perf_counter() - start
+        return wrapper
+
+
+def instrument(bp, phases):
+    """Time the node's phases by wrapping the objects it looks up at run time."""
+    bp.lora_upload_cache.ensure_uploaded = phases.timed("upload", bp.lora_upload_cache.ensure_uploaded)
+
+    class TimedRegistry(bp.JobRegistry):
+        def wait(self, timeout=None):
+            return phases.timed("wait", super().wait)(timeout)
+
+    class TimedFetcher(bp.ResultFetcher):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.session.get = phases.timed("download", self.session.get)
+            self.decode = phases.timed("decode", self.decode)
+
+    bp.JobRegistry = TimedRegistry
+    bp.ResultFetcher = TimedFetcher
+
+
+def run_child(args):
+    bp = load_nodes(args.comfyui)
+    from genera_nodes.backends import get_transport
+    from genera_nodes.lora_cache import LoraUploadCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lora_path = os.path.join(tmp, "bench_lora.safetensors")
+        with open(lora_path, "wb") as f:
+            f.write(os.urandom(args.lora_mb * 1024 * 1024))
+        workflow_path = os.path.join(tmp, "workflow.json")
+        with open(workflow_path, "w") as f:
+            json.dump({
+                "530": {"inputs": {"text": ""}},
+                "81": {"inputs": {"noise_seed": 0}},
+                "517": {"inputs": {"lora_name": "", "strength_model": 1.0}},
+                "532": {"inputs": {"filename_prefix": ""}},
+                **{str(n): {"inputs": {"value": n}, "class_type": "Filler"} for n in range(1000, 1000 + args.workflow_nodes)},
+            }, f)
+
+        bp.folder_paths.get_full_path_or_raise = lambda kind, name: lora_path
+        bp.lora_upload_cache = LoraUploadCache(manifest_path=os.path.join(tmp, "manifest.json"))
+        bp.workflow_template = bp.WorkflowTemplate(workflow_path)
+        phases = PhaseTimes()
+        instrument(bp, phases)
+
+        node = bp.BatchPreviewerBatch()
+        job_publisher = node.get_job_publisher("memory")
+        job_publisher.publish_all = phases.timed("publish", job_publisher.publish_all)
+        server = ResultServer(make_png(args.size), args.http_error_rate)
+        SimulatedWorker(get_transport("memory"), node.topic_name, node.subscription_id,
+                        server, args.latency, args.jitter, args.loss_rate)
+
+        runs = []
+        for repeat in range(args.repeat):
+            phases.totals = dict.fromkeys(PHASES, 0.0)
+            seeds = list(range(repeat * args.child, (repeat + 1) * args.child))
+            batch = bp.ResultBatch(len(seeds))
+            arrivals = []
+            start = time.perf_counter()
+
+            def on_image(index, image):
+                arrivals.append(time.perf_counter() - start)
+                batch.put(index, image)
+
+            node.run_jobs("benchmark", seeds, "bench_lora.safetensors", 1.0, args.max_downloads,
+                          30.0, args.max_wait_time, on_image=on_image, backend="memory")
+            runs.append({
+                "total": time.perf_counter() - start,
+                "first": min(arrivals) if arrivals else None,
+                "last": max(arrivals) if arrivals else None,
+                "received": len(arrivals),
+                **phases.totals,
+            })
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    print(json.dumps({"seeds": args.child, "peak_rss_mb": peak_rss_mb, "runs": runs}))
+
+
+def median(runs, key):
+    values = [run[key] for run in runs if run[key] is not None]
+    return statistics.median(values) if values else None
+
+
+def ms(value):
+    return f"{value * 1000:9.0f}" if value is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, nargs="+", default=[4, 16, 64, 256])
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds from job to result.")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Uniform +- seconds added to the latency.")
+    parser.add_argument("--size", type=int, default=512, help="Result image width and height.")
+    parser.add_argument("--loss-rate", type=float, default=0.0, help="Share of jobs never answered.")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Share of downloads failing with 500.")
+    parser.add_argument("--max-downloads", type=int, default=8)
+    parser.add_argument("--max-wait-time", type=int, default=30)
+    parser.add_argument("--lora-mb", type=int, default=16)
+    parser.add_argument("--workflow-nodes", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--comfyui", default=os.environ.get("COMFYUI_PATH"), help="ComfyUI root, for folder_paths and node_helpers.")
+    parser.add_argument("--json", help="Write the full report to this path.")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args)
+        return
+
+    child_args = list(sys.argv[1:])
+    if "--seeds" in child_args:
+        index = child_args.index("--seeds")
+        end = index + 1
+        while end < len(child_args) and not child_args[end].startswith("--"):
+            end += 1
+        del child_args[index:end]
+
+    print(f"latency {args.latency}s +- {args.jitter}s, {args.size}px results, loss {args.loss_rate:.0%}, "
+          f"HTTP errors {args.http_error_rate:.0%}, median of {args.repeat} runs")
+    print(f"  {'seeds':>6} {'recv':>6} {'first ms':>9} {'last ms':>9} {'RSS MB':>8} "
+          + " ".join(f"{phase + ' ms':>11}" for phase in PHASES))
+    report = []
+    for seeds in args.seeds:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), *child_args, "--child", str(seeds)],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        report.append(result)
+        runs = result["runs"]
+        print(f"  {seeds:>6} {median(runs, 'received'):>6.0f} {ms(median(runs, 'first'))} {ms(median(runs, 'last'))} "
+              f"{result['peak_rss_mb']:>8.0f} " + " ".join(f"{ms(median(runs, phase)):>11}" for phase in PHASES))
+    print("  download and decode are summed over the jobs, they overlap the wait phase")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
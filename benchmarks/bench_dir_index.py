@@ -0,0 +1,59 @@
+"""
+Benchmark of INPUT_TYPES input-directory listing on a synthetic directory:
+os.listdir + os.path.isfile + sorted versus dir_index.list_files.
+
+    python benchmarks/bench_dir_index.py [--files 50000] [--repeat 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dir_index  # noqa: E402
+
+
+def current_listing(path):
+    return sorted(f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)))
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(args.files):
+            open(os.path.join(tmp, f"image_{n:06}.png"), "wb").close()
+        os.mkdir(os.path.join(tmp, "subfolder"))
+        # Age the directory so the index doesn't treat its mtime as racy
+        old = time.time() - 60
+        os.utime(tmp, (old, old))
+
+        assert dir_index.list_files(tmp) == current_listing(tmp)
+        print(f"{args.files} files, mean of {args.repeat} listings")
+        print(f"  {'current listdir + isfile':<30} {timed(lambda: current_listing(tmp), args.repeat) * 1000:10.2f} ms")
+        print(f"  {'dir_index cold scan':<30} {timed(lambda: dir_index.DirectoryIndex(tmp).files(), args.repeat) * 1000:10.2f} ms")
+        print(f"  {'dir_index warm':<30} {timed(lambda: dir_index.list_files(tmp), args.repeat) * 1000:10.2f} ms")
+
+        def add_one():
+            open(os.path.join(tmp, f"new_{time.time_ns()}.png"), "wb").close()
+            os.utime(tmp, (old, time.time() - 30 + add_one.n * 1e-3))
+            add_one.n += 1
+            dir_index.list_files(tmp)
+        add_one.n = 0
+        print(f"  {'dir_index after one new file':<30} {timed(add_one, args.repeat) * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark of IS_CHANGED validation on a large input: whole-file sha256
+versus the memoized, chunked file_fingerprint.
+
+    python benchmarks/bench_file_fingerprint.py [--size-mb 50] [--repeat 20]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_fingerprint import FingerprintCache, hash_file  # noqa: E402
+
+
+def current_is_changed(path):
+    m = hashlib.sha256()
+    with open(path, 'rb') as f:
+        m.update(f.read())
+    return m.digest().hex()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.png")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        sha_cache = FingerprintCache("sha256")
+        fast_cache = FingerprintCache("fast")
+        cases = [
+            ("current: read + sha256", lambda: current_is_changed(path)),
+            ("chunked sha256, cold", lambda: hash_file(path, "sha256")),
+            ("chunked fast hash, cold", lambda: hash_file(path, "fast")),
+            ("memoized sha256, warm", lambda: sha_cache.fingerprint(path)),
+            ("memoized fast hash, warm", lambda: fast_cache.fingerprint(path)),
+        ]
+        sha_cache.fingerprint(path)
+        fast_cache.fingerprint(path)
+        print(f"{args.size_mb} MB input, mean of {args.repeat} validations")
+        for name, fn in cases:
+            print(f"  {name:<26} {timed(fn, args.repeat) * 1000:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of IMAGE tensor -> PNG conversion: the per-image
+``255. * numpy() -> np.clip -> astype`` path versus image_convert.
+
+    python benchmarks/bench_image_convert.py [--batch 4] [--workers 4] [--compress-level 4]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_convert import encode_image, encode_images, tensor_to_uint8  # noqa: E402
+
+
+def current_to_uint8(images):
+    return [np.clip(255. * image.cpu().numpy(), 0, 255).astype(np.uint8) for image in images]
+
+
+def current_encode(images, compress_level):
+    return [encode_image(Image.fromarray(array), "png", compress_level) for array in current_to_uint8(images)]
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--compress-level", type=int, default=4)
+    args = parser.parse_args()
+
+    for size in (1024, 2048):
+        images = torch.rand(args.batch, size, size, 3)
+        cases = [
+            ("to uint8, current", lambda: current_to_uint8(images)),
+            ("to uint8, image_convert", lambda: tensor_to_uint8(images)),
+            ("png, current", lambda: current_encode(images, args.compress_level)),
+            ("png, image_convert", lambda: encode_images(images, "png", args.compress_level)),
+            (f"png, image_convert x{args.workers}",
+             lambda: encode_images(images, "png", args.compress_level, max_workers=args.workers)),
+        ]
+        print(f"{args.batch} x {size}x{size}")
+        for name, fn in cases:
+            elapsed, peak = measure(fn)
+            print(f"  {name:<28} {elapsed * 1000:9.1f} ms   peak numpy alloc {peak / 2 ** 20:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of PainterNode image piping on a 4 x 2048^2 batch: serial PNG +
+base64 data URLs (previous behaviour) versus parallel fast encoding written
+to temp files, with the size of the event payload for each.
+
+    python benchmarks/bench_painter_piping.py [--batch 4] [--size 2048]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_convert import encode_images, tensor_to_pil  # noqa: E402
+
+
+def synthetic_batch(batch, size):
+    ramp = torch.linspace(0, 1, size)
+    image = torch.stack([ramp[None, :].expand(size, size), ramp[:, None].expand(size, size),
+                         torch.full((size, size), 0.5)], dim=-1)
+    return (image[None] + 0.05 * torch.rand(batch, size, size, 3)).clamp(0, 1)
+
+
+def base64_serial(images):
+    urls = []
+    for img in tensor_to_pil(images):
+        buffer = BytesIO()
+        img.save(buffer, format="PNG")
+        urls.append(f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}")
+    return urls
+
+
+def temp_urls(images, tmp, image_format):
+    urls = []
+    for index, buffer in enumerate(encode_images(images, image_format, 1, max_workers=os.cpu_count())):
+        filename = f"painter_bench_{index}.{image_format}"
+        with open(os.path.join(tmp, filename), "wb") as f:
+            f.write(buffer.getbuffer())
+        urls.append(f"/view?filename={filename}&subfolder=painter_piping&type=temp")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--size", type=int, default=2048)
+    args = parser.parse_args()
+
+    images = synthetic_batch(args.batch, args.size)
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("base64 png, serial", lambda: base64_serial(images)),
+            ("temp png level 1, parallel", lambda: temp_urls(images, tmp, "png")),
+            ("temp webp, parallel", lambda: temp_urls(images, tmp, "webp")),
+        ]
+        print(f"{args.batch} x {args.size}x{args.size}, {os.cpu_count()} cpu(s)")
+        for name, fn in cases:
+            start = time.perf_counter()
+            urls = fn()
+            elapsed = time.perf_counter() - start
+            payload = len(json.dumps({"unique_id": "1", "images": urls}))
+            print(f"  {name:<28} {elapsed * 1000:9.1f} ms   event payload {payload / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of the node installer startup work: rmtree + copytree of the
+PainterNode web files versus asset_sync.sync_assets, and the "pip list"
+subprocess versus importlib.metadata for the installed-modules check.
+
+    python benchmarks/bench_startup_sync.py [--repeat 5]
+"""
+import argparse
+import importlib.metadata
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import asset_sync  # noqa: E402
+
+
+def web_sources():
+    sources = []
+    for dir_name in ["js", "css", "assets", "lib", "fonts"]:
+        folder = os.path.join(ROOT, "PainterNode", dir_name)
+        if os.path.exists(folder):
+            sources.append((folder, os.path.join(dir_name, "painternode") if dir_name != "js" else ""))
+    return sources
+
+
+def current_copy(sources, dest):
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    for folder, subdir in sources:
+        shutil.copytree(folder, os.path.join(dest, subdir), dirs_exist_ok=True)
+
+
+def pip_list():
+    result = subprocess.run(
+        [sys.executable, "-m", "pip", "list", "--format=freeze"],
+        capture_output=True, text=True, check=True,
+    )
+    return {line.split("==")[0].lower() for line in result.stdout.splitlines()}
+
+
+def metadata_list():
+    return {dist.metadata["Name"].lower() for dist in importlib.metadata.distributions() if dist.metadata["Name"]}
+
+
+def timed(fn, repeat, setup=None):
+    total = 0.0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        total += time.perf_counter() - start
+    return total / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sources = web_sources()
+    files = sum(len(asset_sync.walk_files(folder)) for folder, _ in sources)
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, "web_alekpet_nodes")
+        print(f"{files} web files, mean of {args.repeat} runs")
+        print(f"  {'rmtree + copytree':<30} {timed(lambda: current_copy(sources, dest), args.repeat) * 1000:10.2f} ms")
+        cold = timed(lambda: asset_sync.sync_assets(sources, dest), args.repeat, lambda: shutil.rmtree(dest, True))
+        print(f"  {'sync_assets cold':<30} {cold * 1000:10.2f} ms")
+        print(f"  {'sync_assets unchanged':<30} {timed(lambda: asset_sync.sync_assets(sources, dest), args.repeat) * 1000:10.2f} ms")
+
+    print(f"  {'pip list subprocess':<30} {timed(pip_list, args.repeat) * 1000:10.2f} ms")
+    print(f"  {'importlib.metadata':<30} {timed(metadata_list, args.repeat) * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark of BatchPreviewer job fan-out: per-seed deepcopy or
+copy-on-write render + json.dumps, a WorkflowTemplate snapshot per seed,
+and one snapshot per fan-out as run_jobs does.
+
+    python benchmarks/bench_workflow_template.py [--seeds 1000] [--nodes 200]
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workflow_template import DEFAULT_PATCH_POINTS, WorkflowTemplate  # noqa: E402
+
+
+def synthetic_workflow(nodes):
+    workflow = {
+        str(i): {
+            "class_type": f"Node{i}",
+            "inputs": {"value": i, "text": "x" * 64, "link": [str(i - 1), 0]},
+            "_meta": {"title": f"Node {i}"},
+        }
+        for i in range(nodes)
+    }
+    for node_id, key in DEFAULT_PATCH_POINTS.values():
+        workflow.setdefault(node_id, {"class_type": "Patched", "inputs": {}})["inputs"][key] = None
+    return workflow
+
+
+def job_values(seed):
+    return {
+        "prompt": "a photo of a cat",
+        "seed": seed,
+        "lora_name": "lora.safetensors",
+        "strength_model": 1.0,
+        "filename_prefix": str(uuid.uuid4())[:4],
+    }
+
+
+def bench_deepcopy(workflow, seeds):
+    for seed in seeds:
+        job_workflow = copy.deepcopy(workflow)
+        for name, value in job_values(seed).items():
+            node_id, key = DEFAULT_PATCH_POINTS[name]
+            job_workflow[node_id]["inputs"][key] = value
+        json.dumps({"id": str(uuid.uuid4()), "workflow": job_workflow,
+                    "uploads": {"loras": ["lora.safetensors"]}}).encode("utf-8")
+
+
+def render(workflow, values):
+    """Per-job workflow copying only the patched nodes and their ``inputs``, the rest is shared."""
+    job_workflow = dict(workflow)
+    for name, value in values.items():
+        node_id, key = DEFAULT_PATCH_POINTS[name]
+        if job_workflow[node_id] is workflow[node_id]:
+            node = dict(workflow[node_id])
+            node["inputs"] = dict(node["inputs"])
+            job_workflow[node_id] = node
+        job_workflow[node_id]["inputs"][key] = value
+    return job_workflow
+
+
+def bench_render(template, seeds):
+    for seed in seeds:
+        json.dumps({"id": str(uuid.uuid4()), "workflow": render(template.load(), job_values(seed)),
+                    "uploads": {"loras": ["lora.safetensors"]}}).encode("utf-8")
+
+
+def bench_encode(template, seeds):
+    uploads = {"loras": ["lora.safetensors"]}
+    for seed in seeds:
+        template.snapshot().encode_job(str(uuid.uuid4()), uploads, job_values(seed))
+
+
+def bench_snapshot(template, seeds):
+    uploads = {"loras": ["lora.safetensors"]}
+    snapshot = template.snapshot()
+    for seed in seeds:
+        snapshot.encode_job(str(uuid.uuid4()), uploads, job_values(seed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, default=1000)
+    parser.add_argument("--nodes", type=int, default=200)
+    args = parser.parse_args()
+
+    workflow = synthetic_workflow(args.nodes)
+    seeds = range(args.seeds)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflow.json")
+        with open(path, "w") as f:
+            json.dump(workflow, f)
+        template = WorkflowTemplate(path)
+        template.load()
+
+        for name, fn, arg in [
+            ("deepcopy + json.dumps", bench_deepcopy, workflow),
+            ("render + json.dumps", bench_render, template),
+            ("snapshot per seed", bench_encode, template),
+            ("snapshot per fan-out", bench_snapshot, template),
+        ]:
+            start = time.perf_counter()
+            fn(arg, seeds)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<24} {args.seeds} jobs: {elapsed * 1000:8.1f} ms "
+                  f"({elapsed / args.seeds * 1e6:7.1f} us/job)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import bisect
+import os
+import threading
+import time
+
+# A directory modified this recently may change again within the same mtime tick
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+class DirectoryIndex:
+    """
+    Sorted listing of the regular files in one directory.
+
+    ``files`` re-uses the cached listing while the directory mtime is
+    unchanged. When it changes the directory is re-read with ``os.scandir``
+    (file types come from the directory entries, no per-file ``stat``) and
+    the sorted list is patched with the added and removed names instead of
+    being re-sorted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._names = set()
+        self._sorted = []
+
+    def _scan(self):
+        with os.scandir(self.path) as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+
+    def files(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            racy = time.time_ns() - mtime_ns < RACY_WINDOW_NS
+            if mtime_ns == self._mtime_ns and not racy:
+                return list(self._sorted)
+
+            names = self._scan()
+            added = names - self._names
+            removed = self._names - names
+            if len(added) + len(removed) > len(self._sorted) // 4:
+                self._sorted = sorted(names)
+            else:
+                for name in removed:
+                    del self._sorted[bisect.bisect_left(self._sorted, name)]
+                for name in added:
+                    bisect.insort(self._sorted, name)
+            self._names = names
+            self._mtime_ns = mtime_ns
+            return list(self._sorted)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def list_files(path):
+    """Sorted names of the regular files in ``path``, served from a per-directory index."""
+    path = os.path.abspath(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = DirectoryIndex(path)
+    return index.files()
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+HASH_CHUNK_SIZE = 1024 * 1024
+CACHE_MAX_ENTRIES = 4096
+
+# "sha256" (default) or "fast": xxh3_128 when xxhash is installed, crc32 otherwise
+FINGERPRINT_HASH = os.environ.get("GENERA_FINGERPRINT_HASH", "sha256")
+
+
+class _Crc32:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+def new_hasher(algorithm):
+    if algorithm == "fast":
+        return xxhash.xxh3_128() if xxhash is not None else _Crc32()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithm=FINGERPRINT_HASH, chunk_size=HASH_CHUNK_SIZE):
+    """Hash ``path`` in chunks without reading it into memory at once."""
+    m = new_hasher(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+class FingerprintCache:
+    """
+    Memoizes file hashes by (path, size, mtime_ns, inode).
+
+    A lookup costs one ``os.stat``; the file is only re-read when one of
+    those changes.
+    """
+
+    def __init__(self, algorithm=FINGERPRINT_HASH, max_entries=CACHE_MAX_ENTRIES):
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def fingerprint(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+        digest = hash_file(path, self.algorithm)
+        with self._lock:
+            self._entries[path] = (key, digest)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return digest
+
+
+fingerprints = FingerprintCache()
+
+
+def file_fingerprint(path):
+    return fingerprints.fingerprint(path)
@@ -0,0 +1,79 @@
+import os
+import threading
+
+# The google-cloud SDKs are imported when a client is first built, not at
+# module import, so workers that never run the GCP nodes don't load them
+
+config_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gcp_config.json')
+
+# HTTP connections kept per client, should cover the parallel uploads of a node
+GCS_POOL_SIZE = int(os.environ.get("GENERA_GCS_POOL_SIZE", 32))
+
+
+def load_credentials(credentials_path, scopes=None):
+    """Service account credentials from ``credentials_path``, without touching GOOGLE_APPLICATION_CREDENTIALS."""
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_file(credentials_path, scopes=scopes)
+
+
+def create_storage_client(credentials_path, pool_size=GCS_POOL_SIZE):
+    """Build a storage client for ``credentials_path`` with a pool of ``pool_size`` connections."""
+    from google.auth.transport.requests import AuthorizedSession
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+
+    credentials = load_credentials(
+        credentials_path, scopes=["https://www.googleapis.com/auth/devstorage.read_write"])
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return storage.Client(project=credentials.project_id, credentials=credentials, _http=session)
+
+
+class StorageClientCache:
+    """
+    Process-wide storage clients and bucket handles.
+
+    Clients are created lazily by ``client_factory(credentials_path)`` on
+    first use and shared by every node execution with the same credentials;
+    buckets are cached per ``(credentials path, bucket name)``.
+    """
+
+    def __init__(self, client_factory=create_storage_client):
+        self.client_factory = client_factory
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._buckets = {}
+
+    def client(self, credentials_path=config_file_path):
+        with self._lock:
+            client = self._clients.get(credentials_path)
+            if client is None:
+                print(f"Creating storage client for {credentials_path}..")
+                client = self.client_factory(credentials_path)
+                self._clients[credentials_path] = client
+            return client
+
+    def bucket(self, bucket_name, credentials_path=config_file_path):
+        key = (credentials_path, bucket_name)
+        with self._lock:
+            bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self.client(credentials_path).bucket(bucket_name)
+            with self._lock:
+                bucket = self._buckets.setdefault(key, bucket)
+        return bucket
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._buckets.clear()
+
+
+storage_clients = StorageClientCache()
+
+
+def get_bucket(bucket_name, credentials_path=config_file_path):
+    return storage_clients.bucket(bucket_name, credentials_path)
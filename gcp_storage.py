@@ -1,10 +1,27 @@
 # original repo https://github.com/Fantaxico/ComfyUI-GCP-Storage
-from google.cloud import storage
 import folder_paths
-from PIL import Image
 import json
 import os
-import numpy as np
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from server import PromptServer
+from aiohttp import web
+
+from .backends import BACKENDS, DEFAULT_BACKEND, get_blob_store
+from .image_convert import COMPRESS_LEVEL, encode_images
+from .upload_spool import get_upload_spool
+
+# image_format -> (file extension, content type)
+IMAGE_FORMATS = {
+    "png": ("png", "image/png"),
+    "webp": ("webp", "image/webp"),
+}
+
+# Attempts per object and base delay in seconds, doubled on every retry
+UPLOAD_RETRIES = 4
+UPLOAD_BACKOFF = 0.5
 
 config_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),'gcp_config.json')
      
@@ -12,7 +29,7 @@ class upload_to_gcp_storage:
     def __init__(self):
         self.output_dir = folder_paths.get_output_directory()
         self.type = "output"
-        self.compress_level = 4
+        self.compress_level = COMPRESS_LEVEL
         
     @classmethod
     def INPUT_TYPES(s):
@@ -27,21 +44,28 @@ class upload_to_gcp_storage:
                     "default": "",
                 }),
             },
-            "optional": {},
+            "optional": {
+                "image_format": (list(IMAGE_FORMATS.keys()), {"tooltip": "Encoding used for the uploaded image."}),
+                "save_local": ("BOOLEAN", {"default": True, "tooltip": "Also keep a copy in the ComfyUI output folder."}),
+                "max_uploads": ("INT", {"default": 8, "min": 1, "max": 64, "tooltip": "Maximum number of images encoded and uploaded in parallel."}),
+                "compress_level": ("INT", {"default": COMPRESS_LEVEL, "min": 0, "max": 9, "tooltip": "PNG zlib level (WebP method, capped at 6); lower is faster and larger."}),
+                "async_upload": ("BOOLEAN", {"default": False, "tooltip": "Queue images on a persistent spool uploaded in the background instead of waiting for the upload."}),
+                "backend": (BACKENDS, {"default": DEFAULT_BACKEND, "tooltip": "Where images are stored: GCS, files under local_storage, or process memory."}),
+            },
         }
     
-    RETURN_TYPES = ()
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("uploaded_uris",)
     FUNCTION = "upload_to_gcp_storage"
     OUTPUT_NODE = True
     CATEGORY = "Genera"
 
-    def upload_to_gcp_storage(self, images, file_name, test_name, bucket_name, config):
-        gcp_service_json = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gcp_config.json")
-        print(f"Setting [GOOGLE_APPLICATION_CREDENTIALS] to {gcp_service_json}..")
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = gcp_service_json
+    def upload_to_gcp_storage(self, images, file_name, test_name, bucket_name, config, image_format="png", save_local=True, max_uploads=8, compress_level=None, async_upload=False, backend=DEFAULT_BACKEND):
+        if compress_level is None:
+            compress_level = self.compress_level
 
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
+        # Shared store, the GCS client is created on the first upload only
+        store = get_blob_store(backend, bucket_name, config_file_path)
 
         if file_name == "0000":  # If file_name is "0", create and upload config.json
             try:
@@ -52,48 +76,117 @@ class upload_to_gcp_storage:
                 return {"error": "Invalid JSON format in config string"}
 
             config_file = "config.json"
-            config_file_path = os.path.join(self.output_dir, config_file)
+            config_json = json.dumps(config_data)
 
             # Save the parsed config to config.json
-            with open(config_file_path, 'w') as json_file:
-                json.dump(config_data, json_file)
+            if save_local:
+                with open(os.path.join(self.output_dir, config_file), 'w') as json_file:
+                    json_file.write(config_json)
 
-            # Upload config.json to GCP storage
-            config_blob = bucket.blob(f"{test_name}/{config_file}")
+            # Upload config.json to the store straight from memory
             print(f"Uploading config.json to {bucket_name}/{test_name}/{config_file}..")
-            config_blob.upload_from_filename(config_file_path)
+            store.put(f"{test_name}/{config_file}", config_json.encode("utf-8"), content_type="application/json")
 
         # Otherwise, proceed with the normal image upload flow
-        file = f"{file_name}.png"
-        subfolder = os.path.dirname(os.path.normpath(file))
-        full_output_folder = os.path.join(self.output_dir, subfolder)
-        full_file_path = os.path.join(full_output_folder, file)
-
-        print(f"Saving file '{file_name}' to {full_file_path}..")
-        results = save_images(self, images, file_name)
-
-        blob = bucket.blob(f"{test_name}/{file}")
-        print(f"Uploading image to {bucket_name}/{test_name}/{file}..")
-        blob.upload_from_filename(full_file_path)
-
-        return {"ui": {"images": results}}
-
-def save_images(self, images, filename_prefix="ComfyUI"):
-    full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
-    results = list()
-    for (batch_number, image) in enumerate(images):
-        i = 255. * image.cpu().numpy()
-        img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-        metadata = None
-        file = f"{filename}.png"
-        img.save(os.path.join(full_output_folder, file), pnginfo=metadata, compress_level=self.compress_level)
-        results.append({
-            "filename": file,
-            "subfolder": subfolder,
-            "type": self.type
-        })
-
-    return results
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(file_name, self.output_dir, images[0].shape[1], images[0].shape[0])
+        extension = IMAGE_FORMATS[image_format][0]
+
+        def upload(batch_number, image):
+            file = indexed_file_name(file_name, batch_number, len(images), extension)
+            local_path = None
+            if save_local:
+                local_path = os.path.join(full_output_folder, indexed_file_name(filename, batch_number, len(images), extension))
+            if async_upload:
+                return spool_image(store, f"{test_name}/{file}", image, image_format, compress_level, local_path, backend)
+            return upload_image(store, f"{test_name}/{file}", image, image_format, compress_level, local_path)
+
+        if async_upload:
+            print(f"Queueing {len(images)} image(s) for {bucket_name}/{test_name}..")
+        else:
+            print(f"Uploading {len(images)} image(s) to {bucket_name}/{test_name}..")
+        uris = [None] * len(images)
+        failed = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_uploads, len(images)))) as executor:
+            futures = {executor.submit(upload, batch_number, image): batch_number
+                       for batch_number, image in enumerate(images)}
+            for future in as_completed(futures):
+                try:
+                    uris[futures[future]] = future.result()
+                except Exception as e:
+                    failed[futures[future]] = e
+
+        if failed:
+            for batch_number, e in sorted(failed.items()):
+                print(f"Error uploading image {batch_number}: {e}")
+            raise RuntimeError(f"Failed to {'queue' if async_upload else 'upload'} {len(failed)} of {len(images)} image(s) to {bucket_name}/{test_name}")
+
+        if async_upload:
+            print(f"Upload spool: {get_upload_spool(get_blob_store).stats()}")
+
+        results = list()
+        if save_local:
+            results = [{
+                "filename": indexed_file_name(filename, batch_number, len(images), extension),
+                "subfolder": subfolder,
+                "type": self.type
+            } for batch_number in range(len(images))]
+
+        return {"ui": {"images": results}, "result": (json.dumps(uris),)}
+
+
+def indexed_file_name(name, batch_number, batch_size, extension):
+    """Single images keep ``name``, batches get one object per index."""
+    if batch_size == 1:
+        return f"{name}.{extension}"
+    return f"{name}_{batch_number:05}.{extension}"
+
+
+def encode_tensor(image, image_format="png", compress_level=COMPRESS_LEVEL, local_path=None):
+    """Encode one image tensor in memory, also writing the bytes to ``local_path`` if given."""
+    buffer = encode_images(image, image_format, compress_level)[0]
+    if local_path is not None:
+        with open(local_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+    return buffer
+
+
+def spool_image(store, object_name, image, image_format="png", compress_level=COMPRESS_LEVEL, local_path=None, backend=DEFAULT_BACKEND):
+    """Encode one image tensor and queue it on the background upload spool; returns its future URI."""
+    buffer = encode_tensor(image, image_format, compress_level, local_path)
+    get_upload_spool(get_blob_store).enqueue(store.name, object_name, buffer.getvalue(),
+                                             IMAGE_FORMATS[image_format][1], config_file_path, backend)
+    return store.uri(object_name)
+
+
+def upload_image(store, object_name, image, image_format="png", compress_level=COMPRESS_LEVEL, local_path=None):
+    """
+    Encode one image tensor and upload it to ``object_name``, retrying with backoff.
+
+    With ``local_path`` the same bytes are also written to disk. Returns the
+    URI of the uploaded object (``gs://`` on GCS).
+    """
+    buffer = encode_tensor(image, image_format, compress_level, local_path)
+
+    content_type = IMAGE_FORMATS[image_format][1]
+    for attempt in range(UPLOAD_RETRIES):
+        try:
+            buffer.seek(0)
+            store.put(object_name, buffer, content_type=content_type)
+            break
+        except Exception as e:
+            if attempt == UPLOAD_RETRIES - 1:
+                raise
+            delay = UPLOAD_BACKOFF * (2 ** attempt) * (1 + random.random())
+            print(f"Upload of {object_name} failed ({e}), retrying in {delay:.1f}s..")
+            time.sleep(delay)
+
+    return store.uri(object_name)
+
+
+@PromptServer.instance.routes.get("/genera/upload_spool")
+async def upload_spool_stats(request):
+    return web.json_response(get_upload_spool(get_blob_store).stats())
+
 
 NODE_CLASS_MAPPINGS = {
     "Genera.GCPStorageNode": upload_to_gcp_storage,
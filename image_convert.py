@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Default zlib level for PNGs written by the Genera nodes
+COMPRESS_LEVEL = 4
+
+
+def tensor_to_uint8(images, out=None):
+    """
+    Convert an IMAGE batch ``[B, H, W, C]`` in 0..1 to a uint8 array.
+
+    Works image by image through one float32 scratch buffer the size of a
+    single image, instead of the two full-batch float copies made by
+    ``np.clip(255. * image.numpy(), 0, 255).astype(np.uint8)``; values are
+    truncated the same way. ``out`` may be a preallocated uint8 array.
+    """
+    if images.dim() == 3:
+        images = images[None]
+    images = images.detach().cpu()
+    if images.dtype != torch.float32:
+        images = images.to(torch.float32)
+    array = images.numpy()
+
+    if out is None:
+        out = np.empty(array.shape, dtype=np.uint8)
+    scratch = np.empty(array.shape[1:], dtype=np.float32)
+    for index in range(array.shape[0]):
+        np.multiply(array[index], 255., out=scratch)
+        np.clip(scratch, 0, 255, out=scratch)
+        np.copyto(out[index], scratch, casting="unsafe")
+    return out
+
+
+def tensor_to_pil(images):
+    """Return one PIL image per entry of an IMAGE batch."""
+    return [Image.fromarray(image) for image in tensor_to_uint8(images)]
+
+
+def encode_image(img, image_format="png", compress_level=COMPRESS_LEVEL):
+    """Encode a PIL image into an in-memory buffer."""
+    buffer = BytesIO()
+    if image_format == "webp":
+        img.save(buffer, format="WEBP", lossless=True, method=min(compress_level, 6))
+    else:
+        img.save(buffer, format="PNG", compress_level=compress_level)
+    buffer.seek(0)
+    return buffer
+
+
+def encode_images(images, image_format="png", compress_level=COMPRESS_LEVEL, max_workers=None):
+    """
+    Encode an IMAGE batch to in-memory buffers, in batch order.
+
+    With ``max_workers`` > 1 the images are encoded on a thread pool; Pillow
+    releases the GIL while compressing, so this scales with cores.
+    """
+    pil_images = tensor_to_pil(images)
+    if not max_workers or max_workers <= 1 or len(pil_images) == 1:
+        return [encode_image(img, image_format, compress_level) for img in pil_images]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pil_images))) as executor:
+        return list(executor.map(lambda img: encode_image(img, image_format, compress_level), pil_images))
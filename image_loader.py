@@ -0,0 +1,109 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps, ImageSequence
+import node_helpers
+
+# Decoded images kept in memory, in bytes of image + mask tensors
+CACHE_MAX_BYTES = int(os.environ.get("GENERA_IMAGE_CACHE_BYTES", 512 * 1024 * 1024))
+
+excluded_formats = ['MPO']
+
+
+def _to_float(array, out):
+    """Scale a uint8 array into ``out`` as float32 0..1 without intermediate copies."""
+    np.multiply(array, np.float32(1 / 255), out=out, dtype=np.float32)
+    return out
+
+
+def pil_to_tensors(img):
+    """
+    Convert a PIL image (all frames of the same size) to ``(image, mask)``.
+
+    ``image`` is ``[B, H, W, 3]`` and ``mask`` is ``[B, H, W]`` at the image
+    size, 1 - alpha when the frame has alpha and zeros otherwise. Each output
+    is allocated once for every frame.
+    """
+    n_frames = getattr(img, "n_frames", 1)
+    if img.format in excluded_formats:
+        n_frames = 1
+
+    images = masks = None
+    count = 0
+    for i in ImageSequence.Iterator(img):
+        if count == n_frames:
+            break
+        i = node_helpers.pillow(ImageOps.exif_transpose, i)
+        if i.mode == 'I':
+            i = i.point(lambda i: i * (1 / 255))
+        image = i.convert("RGB")
+        w, h = image.size
+
+        if images is None:
+            images = np.empty((n_frames, h, w, 3), dtype=np.float32)
+            masks = np.zeros((n_frames, h, w), dtype=np.float32)
+        elif images.shape[1:3] != (h, w):
+            continue
+
+        _to_float(np.asarray(image), images[count])
+        if 'A' in i.getbands():
+            _to_float(np.asarray(i.getchannel('A')), masks[count])
+            np.subtract(1., masks[count], out=masks[count])
+        count += 1
+
+    return torch.from_numpy(images[:count]), torch.from_numpy(masks[:count])
+
+
+class ImageTensorCache:
+    """LRU of decoded ``(image, mask)`` tensors keyed by (path, mtime, size), bounded by bytes."""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def load(self, path):
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        img = node_helpers.pillow(Image.open, path)
+        entry = pil_to_tensors(img)
+        size = entry[0].nbytes + entry[1].nbytes
+        if size > self.max_bytes:
+            return entry
+
+        with self._lock:
+            # Drop stale versions of the same file before inserting
+            for old_key in [k for k in self._entries if k[0] == key[0]]:
+                self._bytes -= self._nbytes(self._entries.pop(old_key))
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._nbytes(self._entries.popitem(last=False)[1])
+        return entry
+
+    @staticmethod
+    def _nbytes(entry):
+        return entry[0].nbytes + entry[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+image_cache = ImageTensorCache()
+
+
+def load_image_tensors(path):
+    """Decode ``path`` to ``(image, mask)`` tensors, reusing the cached result while the file is unchanged."""
+    return image_cache.load(path)
@@ -0,0 +1,60 @@
+import logging
+import time
+from concurrent.futures import wait as wait_futures
+
+# Publisher batching used by BatchPreviewer, fan-out messages are flushed together
+BATCH_MAX_MESSAGES = 100
+BATCH_MAX_BYTES = 9 * 1024 * 1024
+BATCH_MAX_LATENCY = 0.01
+
+
+class JobPublisher:
+    """Publishes a fan-out of jobs and gathers their futures before the wait phase."""
+
+    def __init__(self, publisher, topic_name, timeout=60):
+        self.publisher = publisher
+        self.topic_name = topic_name
+        self.timeout = timeout
+
+    def publish_all(self, messages):
+        """
+        Publish ``{job_id: data}`` and block until every publish settles.
+
+        Returns ``{job_id: error}`` for jobs that failed or timed out.
+        """
+        started = {}
+        latencies = {}
+        futures = {}
+        for job_id, data in messages.items():
+            started[job_id] = time.monotonic()
+            try:
+                future = self.publisher.publish(self.topic_name, data, job_id=job_id)
+            except Exception as e:
+                logging.error(f"Error publishing job {job_id}: {e}")
+                latencies[job_id] = time.monotonic() - started[job_id]
+                futures[job_id] = e
+                continue
+            future.add_done_callback(
+                lambda f, job_id=job_id: latencies.setdefault(job_id, time.monotonic() - started[job_id]))
+            futures[job_id] = future
+
+        wait_futures([f for f in futures.values() if not isinstance(f, Exception)],
+                     timeout=self.timeout)
+
+        failed = {}
+        for job_id, future in futures.items():
+            if isinstance(future, Exception):
+                failed[job_id] = future
+            elif not future.done():
+                failed[job_id] = TimeoutError(f"Publish not confirmed after {self.timeout}s")
+            elif future.exception() is not None:
+                failed[job_id] = future.exception()
+
+        for job_id, error in failed.items():
+            logging.error(f"Publishing job {job_id} failed: {error}")
+        if latencies:
+            values = sorted(latencies.values())
+            logging.info(
+                f"Published {len(messages) - len(failed)}/{len(messages)} jobs, "
+                f"latency min {values[0] * 1000:.0f}ms / max {values[-1] * 1000:.0f}ms.")
+        return failed
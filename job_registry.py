@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class JobRegistry:
+    """
+    Thread-safe set of in-flight BatchPreviewer jobs.
+
+    Subscriber and download threads ``claim`` and ``resolve`` jobs while the
+    node thread blocks in ``wait``, which returns as soon as the last job is
+    resolved instead of polling.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._claimed = set()
+        self._results = {}
+
+    def add(self, job_id):
+        with self._cond:
+            self._pending.add(job_id)
+
+    def claim(self, job_id):
+        """Mark a job's result message as received; False for unknown or duplicate ids."""
+        with self._cond:
+            if job_id not in self._pending or job_id in self._claimed:
+                return False
+            self._claimed.add(job_id)
+            return True
+
+    def resolve(self, job_id, result=None, error=None):
+        with self._cond:
+            if job_id not in self._pending:
+                return
+            self._pending.discard(job_id)
+            self._results[job_id] = (result, error)
+            self._cond.notify_all()
+
+    def resolve_future(self, job_id, future):
+        """Resolve ``job_id`` from a finished concurrent future."""
+        try:
+            self.resolve(job_id, result=future.result())
+        except Exception as e:
+            self.resolve(job_id, error=e)
+
+    def wait(self, timeout=None):
+        """Block until every job is resolved or ``timeout`` seconds pass; True if all finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return not self._pending
+
+    def pending(self):
+        with self._cond:
+            return set(self._pending)
+
+    def results(self):
+        """Resolved jobs as ``{job_id: (result, error)}`` in resolution order."""
+        with self._cond:
+            return dict(self._results)
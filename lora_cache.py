@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+# Multiple of 256 KiB as required for resumable uploads
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+manifest_file_path = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), 'lora_upload_manifest.json')
+
+
+def file_sha256(path, chunk_size=HASH_CHUNK_SIZE):
+    m = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            m.update(chunk)
+    return m.hexdigest()
+
+
+class ProgressReader:
+    """File wrapper that logs how much of an upload has been read."""
+
+    def __init__(self, f, total, label, step=0.1):
+        self.f = f
+        self.total = total
+        self.label = label
+        self.step = step
+        self.read_bytes = 0
+        self.next_report = step
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.read_bytes += len(data)
+        if self.total and self.read_bytes / self.total >= self.next_report:
+            logging.info(f"Uploading {self.label}: {self.read_bytes * 100 // self.total}%")
+            while self.next_report <= self.read_bytes / self.total:
+                self.next_report += self.step
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+
+class LoraUploadCache:
+    """
+    Maps local LoRA files to content-addressed blobs ``loras/<sha256><ext>``.
+
+    The manifest remembers (path, size, mtime, sha256) and which buckets
+    already hold the blob, so an unchanged LoRA costs one ``os.stat`` per run
+    and a changed one is re-hashed and uploaded under its new name.
+    """
+
+    def __init__(self, manifest_path=manifest_file_path, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.manifest_path = manifest_path
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._upload_locks = {}
+        self._manifest = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.error(f"Error loading LoRA manifest, starting empty: {e}")
+            return {}
+
+    def _save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _entry(self, lora_path):
+        """
+        Return ``(path, manifest entry)`` for ``lora_path``, re-hashing only if
+        size or mtime changed. Hashing runs outside the lock.
+        """
+        path = os.path.abspath(lora_path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._manifest.get(path)
+            if entry is not None and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                return path, entry
+
+        logging.info(f"Hashing LoRA {path}...")
+        sha256 = file_sha256(path)
+        with self._lock:
+            entry = self._manifest.get(path)
+            # Another run may have hashed the same version meanwhile
+            if entry is None or (entry["size"], entry["mtime_ns"], entry["sha256"]) != (st.st_size, st.st_mtime_ns, sha256):
+                entry = {
+                    "size": st.st_size,
+                    "mtime_ns": st.st_mtime_ns,
+                    "sha256": sha256,
+                    "buckets": [],
+                }
+                self._manifest[path] = entry
+            return path, entry
+
+    def _upload_lock(self, location, object_name):
+        with self._lock:
+            return self._upload_locks.setdefault((location, object_name), threading.Lock())
+
+    def ensure_uploaded(self, store, lora_path):
+        """
+        Upload ``lora_path`` to the blob ``store`` unless known to be there; returns the remote file name.
+
+        The manifest lock is only held to read and update entries; uploads of
+        the same blob to the same store wait for each other, others run in parallel.
+        """
+        path, entry = self._entry(lora_path)
+        name = entry["sha256"] + os.path.splitext(lora_path)[1]
+        object_name = f"loras/{name}"
+
+        with self._upload_lock(store.location, object_name):
+            # Remembered per store location, the same bucket name can exist on several backends
+            with self._lock:
+                if store.location in entry["buckets"]:
+                    return name
+
+            if store.exists(object_name):
+                print(f"File {name} already exists in bucket, skipping upload.")
+            else:
+                with open(path, 'rb') as f:
+                    store.put(object_name, ProgressReader(f, entry["size"], name),
+                              size=entry["size"], chunk_size=self.chunk_size)
+                print(f"File {lora_path} uploaded to {object_name}.")
+
+            with self._lock:
+                if store.persistent and store.location not in entry["buckets"]:
+                    entry["buckets"].append(store.location)
+                self._save()
+        return name
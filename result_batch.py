@@ -0,0 +1,63 @@
+import threading
+
+import torch
+import torch.nn.functional as F
+
+SIZE_POLICIES = ["resize", "pad"]
+
+
+class ResultBatch:
+    """
+    Preallocated ``[N, H, W, C]`` IMAGE batch filled in slot order as results arrive.
+
+    The tensor is allocated when the first result lands, using its size.
+    Later results of another resolution are either resized to it
+    (``"resize"``) or zero-padded / cropped from the top-left (``"pad"``).
+    """
+
+    def __init__(self, size, policy="resize"):
+        if policy not in SIZE_POLICIES:
+            raise ValueError(f"Unknown size policy '{policy}', expected one of {SIZE_POLICIES}")
+        self.size = size
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._images = None
+        self._filled = [False] * size
+
+    def put(self, index, image):
+        """Store the first frame of ``image`` (``[B, H, W, C]``) in slot ``index``."""
+        image = image[0]
+        with self._lock:
+            if self._images is None:
+                self._images = torch.zeros((self.size, *image.shape), dtype=image.dtype)
+            self._images[index].copy_(self._fit(image))
+            self._filled[index] = True
+
+    def _fit(self, image):
+        height, width, channels = self._images.shape[1:]
+        image = image[..., :channels]
+        if image.shape[0] == height and image.shape[1] == width:
+            return image
+        if self.policy == "resize":
+            resized = F.interpolate(image.movedim(-1, 0)[None], size=(height, width),
+                                    mode="bilinear", align_corners=False)
+            return resized[0].movedim(0, -1)
+        out = torch.zeros((height, width, channels), dtype=image.dtype)
+        h = min(height, image.shape[0])
+        w = min(width, image.shape[1])
+        out[:h, :w] = image[:h, :w]
+        return out
+
+    def filled(self):
+        with self._lock:
+            return [i for i, done in enumerate(self._filled) if done]
+
+    def images(self):
+        """Return the batch of filled slots in order, or None if nothing arrived."""
+        with self._lock:
+            if self._images is None:
+                return None
+            if all(self._filled):
+                return self._images
+            index = torch.tensor([i for i, done in enumerate(self._filled) if done])
+            return self._images.index_select(0, index)
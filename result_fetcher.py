@@ -0,0 +1,69 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+
+from urllib.parse import urlparse
+
+from .backends import read_uri
+
+
+class ResultFetcher:
+    """
+    Download stage for BatchPreviewer results.
+
+    Pub/Sub callbacks only hand URLs to ``submit`` and ack straight away; the
+    HTTP transfer and decoding run on a bounded worker pool sharing one pooled
+    session, so a slow download never holds a subscriber thread.
+
+    Result URLs come from worker messages; besides HTTP(S) only the schemes
+    in ``uri_schemes`` are read, from the local blob stores.
+    """
+
+    def __init__(self, max_in_flight=8, timeout=30.0, decode=None, uri_schemes=()):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.timeout = timeout
+        self.decode = decode
+        self.uri_schemes = tuple(uri_schemes)
+
+        # Imported here so loading the node modules doesn't pull in requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_in_flight,
+                              pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                           thread_name_prefix="result-fetcher")
+
+    def fetch(self, url):
+        if url.startswith(("http://", "https://")):
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            content = response.content
+        elif urlparse(url).scheme in self.uri_schemes:
+            # Results written by the local and memory backends
+            content = read_uri(url)
+        else:
+            raise ValueError(f"Refusing to fetch result URL {url}")
+        img = Image.open(BytesIO(content))
+        if self.decode is not None:
+            return self.decode(img)
+        return img
+
+    def submit(self, url):
+        """Queue ``url`` for download and return a future for its result."""
+        logging.info(f"Queued result download {url}")
+        return self.executor.submit(self.fetch, url)
+
+    def matches(self, max_in_flight, timeout, uri_schemes=()):
+        return (self.max_in_flight == max(1, int(max_in_flight)) and self.timeout == timeout
+                and self.uri_schemes == tuple(uri_schemes))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,110 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+
+class ResultListener:
+    """
+    Long-lived streaming pull on the BatchPreviewer result subscription.
+
+    One listener is shared by every run in the process. Incoming messages are
+    routed to the handler registered for their ``id``. Jobs register with a
+    key describing what they render; when a run stops waiting for a job with
+    ``unregister(job_id, cache_late=True)``, its result is still cached under
+    that key if it arrives later, and ``take_cached`` hands it to the next
+    run asking for the same content. Both the abandoned jobs and the cache
+    keep the ``max_cached_results`` most recent entries. Other unknown
+    results are acknowledged and dropped.
+    """
+
+    def __init__(self, subscriber, subscription_id, max_cached_results=256):
+        self.subscriber = subscriber
+        self.subscription_id = subscription_id
+        self.max_cached_results = max_cached_results
+        self._lock = threading.Lock()
+        self._routes = {}  # job id -> (handler, key)
+        self._abandoned = OrderedDict()  # job id -> key, for runs that stopped waiting
+        self._cached = OrderedDict()  # key -> result data that arrived late
+        self._streaming_pull_future = None
+
+    def start(self):
+        with self._lock:
+            if self._streaming_pull_future is not None and not self._streaming_pull_future.done():
+                return
+            logging.info(f"Opening result stream on {self.subscription_id}...")
+            self._streaming_pull_future = self.subscriber.subscribe(
+                self.subscription_id, callback=self._on_message)
+
+    def stop(self):
+        with self._lock:
+            future, self._streaming_pull_future = self._streaming_pull_future, None
+        if future is not None:
+            future.cancel()
+
+    def register(self, job_id, handler, key=None):
+        """Route the result for ``job_id`` to ``handler(data)``; ``key`` names its content for the late-result cache."""
+        with self._lock:
+            self._routes[job_id] = (handler, key)
+
+    def unregister(self, job_id, cache_late=False):
+        """Stop routing ``job_id``; with ``cache_late`` a result arriving afterwards is cached under its key."""
+        with self._lock:
+            _, key = self._routes.pop(job_id, (None, None))
+            if cache_late and key is not None:
+                self._remember(self._abandoned, job_id, key)
+
+    def take_cached(self, key):
+        """Pop the late result cached for ``key``, None if there is none."""
+        with self._lock:
+            return self._cached.pop(key, None)
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_cached_results:
+            entries.popitem(last=False)
+
+    def _on_message(self, message):
+        try:
+            data = json.loads(message.data.decode("utf-8"))
+            job_id = data["id"]
+        except Exception as e:
+            logging.error(f"Error processing message: {e}")
+            message.nack()
+            return
+
+        with self._lock:
+            handler, key = self._routes.pop(job_id, (None, None))
+            if handler is None:
+                key = self._abandoned.pop(job_id, None)
+                if key is not None:
+                    self._remember(self._cached, key, data)
+        message.ack()
+
+        if handler is None:
+            if key is None:
+                logging.info(f"Dropping result for job {job_id}, no run is waiting for it.")
+            else:
+                logging.info(f"Caching late result for job {job_id}.")
+            return
+        try:
+            handler(data)
+        except Exception as e:
+            logging.error(f"Error handling result for job {job_id}: {e}")
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def get_result_listener(subscriber, subscription_id):
+    """Return the process-wide listener for ``subscription_id`` on ``subscriber``, started on first use."""
+    key = (id(subscriber), subscription_id)
+    with _listeners_lock:
+        listener = _listeners.get(key)
+        if listener is None:
+            listener = ResultListener(subscriber, subscription_id)
+            _listeners[key] = listener
+    listener.start()
+    return listener
@@ -0,0 +1,84 @@
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Unset or false: off. True ("1", "yes", "on", ...): report to startup_timing.json next to
+# this file. A value with a path separator or ending in .json: report path
+STARTUP_TIMING = os.environ.get("GENERA_STARTUP_TIMING", "")
+DEFAULT_REPORT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "startup_timing.json")
+FALSE_VALUES = {"", "0", "false", "no", "off"}
+
+
+def _report_path(setting):
+    """Report path for a ``GENERA_STARTUP_TIMING`` value, None when timing is off."""
+    value = setting.strip()
+    if value.lower() in FALSE_VALUES:
+        return None
+    separators = [sep for sep in (os.sep, os.altsep, "/") if sep]
+    if any(sep in value for sep in separators) or value.lower().endswith(".json"):
+        return value
+    return DEFAULT_REPORT_PATH
+
+
+def _route_count():
+    # Routes are registered by decorators while the node modules are imported
+    server = sys.modules.get("server")
+    try:
+        return len(server.PromptServer.instance.routes)
+    except (AttributeError, TypeError):
+        return 0
+
+
+class StartupTimer:
+    """
+    Wall time of the named phases of the package import.
+
+    Disabled unless ``GENERA_STARTUP_TIMING`` is set, in which case
+    ``finish`` writes a JSON report and prints a one-line summary. Each
+    phase also records how many server routes it registered.
+    """
+
+    def __init__(self, setting=STARTUP_TIMING):
+        self.report_path = _report_path(setting)
+        self.enabled = self.report_path is not None
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        routes = _route_count()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {"name": name, "ms": round((time.perf_counter() - start) * 1000, 2)}
+            routes = _route_count() - routes
+            if routes:
+                entry["routes"] = routes
+            self.phases.append(entry)
+
+    def report(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "phases": self.phases,
+        }
+
+    def finish(self):
+        if not self.enabled:
+            return None
+        report = self.report()
+        try:
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        except OSError as e:
+            print(f"[Genera] Could not write startup timing report {self.report_path}: {e}")
+        summary = ", ".join(f"{phase['name']} {phase['ms']:.0f} ms" for phase in self.phases)
+        print(f"[Genera] Startup {report['total_ms']:.0f} ms: {summary}")
+        return report
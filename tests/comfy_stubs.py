@@ -0,0 +1,70 @@
+"""
+Stand-ins for the ComfyUI modules the nodes import (folder_paths, server,
+node_helpers), and a loader for the node modules without running the
+package installer in ``__init__``.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "genera_nodes"
+
+
+def _folder_paths():
+    module = types.ModuleType("folder_paths")
+    base = tempfile.mkdtemp(prefix="genera-tests-")
+    module.base_path = base
+    module.get_output_directory = lambda: os.path.join(base, "output")
+    module.get_input_directory = lambda: os.path.join(base, "input")
+    module.get_temp_directory = lambda: os.path.join(base, "temp")
+    module.get_filename_list = lambda folder_name: []
+    module.get_annotated_filepath = lambda name: os.path.join(module.get_input_directory(), name)
+    module.exists_annotated_filepath = lambda name: os.path.exists(module.get_annotated_filepath(name))
+
+    def get_full_path_or_raise(folder_name, filename):
+        raise FileNotFoundError(f"{folder_name}/{filename}")
+
+    module.get_full_path_or_raise = get_full_path_or_raise
+    return module
+
+
+def _server():
+    from aiohttp import web
+
+    module = types.ModuleType("server")
+
+    class PromptServer:
+        instance = types.SimpleNamespace(routes=web.RouteTableDef(), send_sync=lambda *args, **kwargs: None)
+
+    module.PromptServer = PromptServer
+    return module
+
+
+def _node_helpers():
+    module = types.ModuleType("node_helpers")
+    module.pillow = lambda fn, arg: fn(arg)
+    return module
+
+
+def install():
+    """Register the stand-ins in ``sys.modules`` unless the real ComfyUI modules are importable."""
+    for name, factory in [("folder_paths", _folder_paths), ("server", _server), ("node_helpers", _node_helpers)]:
+        if name in sys.modules:
+            continue
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            sys.modules[name] = factory()
+
+
+def load(module_name):
+    """Import ``module_name`` from the repository as part of the node package."""
+    install()
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{module_name}")
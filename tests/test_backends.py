@@ -0,0 +1,49 @@
+import threading
+
+import comfy_stubs
+
+backends = comfy_stubs.load("backends")
+
+
+def test_messages_for_unopened_subscriptions_are_dropped():
+    transport = backends.InProcessTransport()
+
+    transport.publish("jobs", b"job")
+
+    assert transport._queue("jobs").qsize() == 0
+
+
+def test_messages_wait_for_a_subscriber_that_went_away():
+    transport = backends.InProcessTransport()
+    transport.subscribe("jobs", lambda message: None).cancel()
+
+    transport.publish("jobs", b"job")
+
+    received = threading.Event()
+    subscription = transport.subscribe("jobs", lambda message: received.set())
+    try:
+        assert received.wait(5)
+    finally:
+        subscription.cancel()
+
+
+def test_queues_are_bounded():
+    transport = backends.InProcessTransport(max_queued=3)
+    transport.subscribe("jobs", lambda message: None).cancel()
+
+    for i in range(10):
+        transport.publish("jobs", b"job %d" % i)
+
+    assert transport._queue("jobs").qsize() == 3
+
+
+def test_message_taken_while_cancelling_is_put_back():
+    transport = backends.InProcessTransport()
+    subscription = transport.subscribe("jobs", lambda message: None)
+    # cancel() lands between the cancelled check and the submit
+    subscription._executor.shutdown()
+    transport.publish("jobs", b"job")
+    subscription._thread.join(5)
+
+    assert not subscription._thread.is_alive()
+    assert transport._queue("jobs").qsize() == 1
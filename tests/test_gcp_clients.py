@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import comfy_stubs
+
+gcp_clients = comfy_stubs.load("gcp_clients")
+
+
+class FakeClient:
+    def __init__(self, credentials_path):
+        self.credentials_path = credentials_path
+
+    def bucket(self, bucket_name):
+        return (self, bucket_name)
+
+
+class CountingFactory:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def __call__(self, credentials_path):
+        with self.lock:
+            self.calls.append(credentials_path)
+        return FakeClient(credentials_path)
+
+
+def test_one_client_per_credentials_across_buckets():
+    factory = CountingFactory()
+    cache = gcp_clients.StorageClientCache(factory)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        buckets = list(executor.map(lambda i: cache.bucket(f"bucket-{i % 3}", "creds.json"), range(64)))
+
+    assert factory.calls == ["creds.json"]
+    assert len({id(bucket) for bucket in buckets}) == 3
+    assert cache.bucket("bucket-0", "creds.json") is buckets[0]
+
+
+def test_clients_are_keyed_by_credentials():
+    factory = CountingFactory()
+    cache = gcp_clients.StorageClientCache(factory)
+
+    first = cache.client("a.json")
+    second = cache.client("b.json")
+
+    assert first is not second
+    assert cache.client("a.json") is first
+    assert sorted(factory.calls) == ["a.json", "b.json"]
+
+
+def test_clear_drops_clients_and_buckets():
+    factory = CountingFactory()
+    cache = gcp_clients.StorageClientCache(factory)
+    bucket = cache.bucket("bucket", "creds.json")
+
+    cache.clear()
+
+    assert cache.bucket("bucket", "creds.json") is not bucket
+    assert len(factory.calls) == 2
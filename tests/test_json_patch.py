@@ -0,0 +1,102 @@
+import copy
+
+import pytest
+
+import comfy_stubs
+
+json_patch = comfy_stubs.load("PainterNode.json_patch")
+apply_patch = json_patch.apply_patch
+JsonPatchError = json_patch.JsonPatchError
+
+
+@pytest.fixture
+def doc():
+    return {"objects": [{"type": "path"}, {"type": "rect"}], "size": {"w": 512, "h": 512}, "a/b": 1, "m~n": 2}
+
+
+@pytest.mark.parametrize("operation, expected", [
+    ({"op": "add", "path": "/objects/-", "value": {"type": "circle"}},
+     {"objects": [{"type": "path"}, {"type": "rect"}, {"type": "circle"}]}),
+    ({"op": "add", "path": "/objects/0", "value": {"type": "circle"}},
+     {"objects": [{"type": "circle"}, {"type": "path"}, {"type": "rect"}]}),
+    ({"op": "add", "path": "/size/d", "value": 1}, {"size": {"w": 512, "h": 512, "d": 1}}),
+    ({"op": "add", "path": "/size/w", "value": 1}, {"size": {"w": 1, "h": 512}}),
+    ({"op": "remove", "path": "/objects/0"}, {"objects": [{"type": "rect"}]}),
+    ({"op": "remove", "path": "/size/h"}, {"size": {"w": 512}}),
+    ({"op": "replace", "path": "/objects/1/type", "value": "ellipse"},
+     {"objects": [{"type": "path"}, {"type": "ellipse"}]}),
+    ({"op": "replace", "path": "/a~1b", "value": 3}, {"a/b": 3}),
+    ({"op": "replace", "path": "/m~0n", "value": 3}, {"m~n": 3}),
+    ({"op": "move", "from": "/objects/0", "path": "/objects/-"},
+     {"objects": [{"type": "rect"}, {"type": "path"}]}),
+    ({"op": "move", "from": "/size/w", "path": "/width"}, {"size": {"h": 512}, "width": 512}),
+    ({"op": "copy", "from": "/size", "path": "/objects/1"},
+     {"objects": [{"type": "path"}, {"w": 512, "h": 512}, {"type": "rect"}]}),
+    ({"op": "test", "path": "/size", "value": {"h": 512, "w": 512.0}}, {}),
+])
+def test_operations(doc, operation, expected):
+    assert apply_patch(doc, [operation]) == {**doc, **expected}
+
+
+def test_operations_apply_in_order(doc):
+    patched = apply_patch(doc, [
+        {"op": "test", "path": "/objects/1/type", "value": "rect"},
+        {"op": "remove", "path": "/objects/0"},
+        {"op": "add", "path": "/objects/1", "value": {"type": "line"}},
+    ])
+    assert patched["objects"] == [{"type": "rect"}, {"type": "line"}]
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "test", "path": "/size/w", "value": 513},
+    {"op": "test", "path": "/a~1b", "value": True},
+    {"op": "test", "path": "/size", "value": {"w": 512}},
+    {"op": "test", "path": "/objects/0/type", "value": ["path"]},
+    {"op": "remove", "path": "/missing"},
+    {"op": "remove", "path": "/objects/2"},
+    {"op": "remove", "path": "/objects/-"},
+    {"op": "add", "path": "/objects/3", "value": 1},
+    {"op": "add", "path": "/objects/01", "value": 1},
+    {"op": "add", "path": "/missing/child", "value": 1},
+    {"op": "add", "path": "objects", "value": 1},
+    {"op": "add", "path": "/size/w"},
+    {"op": "replace", "path": "/missing", "value": 1},
+    {"op": "move", "from": "/size", "path": "/size/inner"},
+    {"op": "copy", "from": "/missing", "path": "/x"},
+    {"op": "remove", "path": ""},
+    {"op": "bogus", "path": "/size"},
+])
+def test_invalid_operations_raise(doc, operation):
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [operation])
+
+
+def test_boolean_and_number_are_different_types():
+    assert apply_patch({"flag": True, "n": 1}, [{"op": "test", "path": "/n", "value": 1.0}])
+    with pytest.raises(JsonPatchError):
+        apply_patch({"flag": True}, [{"op": "test", "path": "/flag", "value": 1}])
+    with pytest.raises(JsonPatchError):
+        apply_patch({"n": 0}, [{"op": "test", "path": "/n", "value": False}])
+
+
+@pytest.mark.parametrize("operations", ["not a list", ["not an object"]])
+def test_malformed_patches_raise(operations):
+    with pytest.raises(JsonPatchError):
+        apply_patch({}, operations)
+
+
+def test_failed_patch_leaves_document_untouched(doc):
+    original = copy.deepcopy(doc)
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [
+            {"op": "add", "path": "/objects/-", "value": {"type": "circle"}},
+            {"op": "replace", "path": "/size/w", "value": 1},
+            {"op": "test", "path": "/size/w", "value": 2},
+        ])
+    assert doc == original
+
+
+def test_unchanged_parts_are_shared(doc):
+    patched = apply_patch(doc, [{"op": "replace", "path": "/size/w", "value": 1}])
+    assert patched["objects"] is doc["objects"]
+    assert doc["size"]["w"] == 512
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import comfy_stubs
+
+backends = comfy_stubs.load("backends")
+lora_cache = comfy_stubs.load("lora_cache")
+
+
+class CountingStore(backends.MemoryBlobStore):
+    """Memory store that counts calls and claims to persist, like a real bucket."""
+
+    persistent = True
+
+    def __init__(self, bucket_name):
+        super().__init__(bucket_name)
+        self.location = f"counting://{bucket_name}"
+        self.puts = []
+        self.exists_calls = 0
+
+    def put(self, object_name, data, content_type=None, size=None, chunk_size=None):
+        self.puts.append(object_name)
+        super().put(object_name, data, content_type, size, chunk_size)
+
+    def exists(self, object_name):
+        self.exists_calls += 1
+        return super().exists(object_name)
+
+
+@pytest.fixture
+def lora(tmp_path):
+    path = tmp_path / "style.safetensors"
+    path.write_bytes(b"first weights")
+    return path
+
+
+def expected_name(data):
+    return hashlib.sha256(data).hexdigest() + ".safetensors"
+
+
+def test_unchanged_lora_is_uploaded_once(tmp_path, lora):
+    manifest = str(tmp_path / "manifest.json")
+    store = CountingStore("bucket")
+
+    name = lora_cache.LoraUploadCache(manifest).ensure_uploaded(store, str(lora))
+    # A new cache reads the manifest, as after a restart
+    again = lora_cache.LoraUploadCache(manifest).ensure_uploaded(store, str(lora))
+
+    assert name == again == expected_name(b"first weights")
+    assert store.puts == [f"loras/{name}"]
+    assert store.exists_calls == 1
+    assert store.get(f"loras/{name}") == b"first weights"
+
+
+def test_changed_lora_is_uploaded_under_its_new_hash(tmp_path, lora):
+    cache = lora_cache.LoraUploadCache(str(tmp_path / "manifest.json"))
+    store = CountingStore("bucket")
+    first = cache.ensure_uploaded(store, str(lora))
+
+    lora.write_bytes(b"second weights, retrained")
+    second = cache.ensure_uploaded(store, str(lora))
+
+    assert second == expected_name(b"second weights, retrained") != first
+    assert store.puts == [f"loras/{first}", f"loras/{second}"]
+
+
+def test_blob_already_in_bucket_is_not_uploaded(tmp_path, lora):
+    store = CountingStore("bucket")
+    store.put(f"loras/{expected_name(b'first weights')}", b"first weights")
+    store.puts.clear()
+
+    lora_cache.LoraUploadCache(str(tmp_path / "manifest.json")).ensure_uploaded(store, str(lora))
+
+    assert store.puts == []
+
+
+def test_buckets_are_tracked_per_location(tmp_path, lora):
+    cache = lora_cache.LoraUploadCache(str(tmp_path / "manifest.json"))
+    local = backends.LocalBlobStore("bucket", root=str(tmp_path / "storage"))
+    counting = CountingStore("bucket")
+
+    name = cache.ensure_uploaded(local, str(lora))
+    cache.ensure_uploaded(counting, str(lora))
+
+    assert os.path.isfile(tmp_path / "storage" / "bucket" / "loras" / name)
+    assert counting.puts == [f"loras/{name}"]
+    assert cache._manifest[str(lora)]["buckets"] == [local.location, counting.location]
+
+
+def test_non_persistent_stores_are_not_remembered(tmp_path, lora):
+    manifest = str(tmp_path / "manifest.json")
+    store = backends.MemoryBlobStore("bucket")
+
+    name = lora_cache.LoraUploadCache(manifest).ensure_uploaded(store, str(lora))
+
+    # A new process gets an empty memory store, the manifest must not claim it holds the blob
+    assert lora_cache.LoraUploadCache(manifest)._manifest[str(lora)]["buckets"] == []
+    fresh = CountingStore("bucket")
+    fresh.persistent = False
+    lora_cache.LoraUploadCache(manifest).ensure_uploaded(fresh, str(lora))
+    assert fresh.puts == [f"loras/{name}"]
+
+
+class BlockingStore(CountingStore):
+    def __init__(self, bucket_name):
+        super().__init__(bucket_name)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def put(self, object_name, data, content_type=None, size=None, chunk_size=None):
+        self.started.set()
+        assert self.release.wait(5)
+        super().put(object_name, data, content_type, size, chunk_size)
+
+
+def test_slow_upload_does_not_block_other_loras(tmp_path, lora):
+    cache = lora_cache.LoraUploadCache(str(tmp_path / "manifest.json"))
+    slow = BlockingStore("bucket")
+    other = tmp_path / "other.safetensors"
+    other.write_bytes(b"other weights")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        uploads = [executor.submit(cache.ensure_uploaded, slow, str(lora)) for _ in range(2)]
+        assert slow.started.wait(5)
+        # Hashing and uploading another LoRA doesn't wait for the slow upload
+        assert cache.ensure_uploaded(CountingStore("other"), str(other)) == expected_name(b"other weights")
+        slow.release.set()
+        names = [upload.result(timeout=5) for upload in uploads]
+
+    assert names == [expected_name(b"first weights")] * 2
+    # The second run waited for the first upload of the same blob instead of repeating it
+    assert slow.puts == [f"loras/{names[0]}"]
@@ -0,0 +1,25 @@
+import json
+import os
+import subprocess
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+NODE_MODULES = ["gcp_storage", "batch_tester", "batch_previewer", "utils", "mask_drawer"]
+CLOUD_MODULES = ("google.cloud", "google.auth", "google.oauth2", "requests")
+
+CHILD = f"""
+import json, sys
+sys.path.insert(0, {TESTS_DIR!r})
+import comfy_stubs
+for name in {NODE_MODULES!r}:
+    comfy_stubs.load(name)
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def test_node_modules_do_not_import_cloud_sdks():
+    # Fresh interpreter, other tests in this process may have loaded the SDKs already
+    output = subprocess.run([sys.executable, "-c", CHILD], capture_output=True, text=True, check=True).stdout
+    modules = json.loads(output.strip().splitlines()[-1])
+    loaded = [name for name in modules if name.startswith(CLOUD_MODULES)]
+    assert loaded == []
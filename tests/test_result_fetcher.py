@@ -0,0 +1,109 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+import comfy_stubs
+
+result_fetcher = comfy_stubs.load("result_fetcher")
+
+
+def make_png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server():
+    """Serves ``/<latency ms>/<red>.png`` after sleeping the latency, and 404 for anything else."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 2 or not parts[1].endswith(".png"):
+                self.send_error(404)
+                return
+            time.sleep(int(parts[0]) / 1000)
+            body = make_png((int(parts[1][:-4]), 0, 0))
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_results_download_concurrently(server):
+    latencies = [300, 250, 200, 300, 150, 300, 250, 300]
+    fetcher = result_fetcher.ResultFetcher(max_in_flight=len(latencies), timeout=5,
+                                           decode=lambda img: img.getpixel((0, 0)))
+    try:
+        start = time.perf_counter()
+        futures = [fetcher.submit(f"{server}/{latency}/{i}.png") for i, latency in enumerate(latencies)]
+        pixels = [future.result(timeout=10) for future in futures]
+        elapsed = time.perf_counter() - start
+    finally:
+        fetcher.close()
+
+    assert pixels == [(i, 0, 0) for i in range(len(latencies))]
+    # About the slowest download rather than the sum of all of them
+    assert elapsed < max(latencies) / 1000 + 0.5 < sum(latencies) / 1000
+
+
+def test_in_flight_downloads_are_bounded(server):
+    fetcher = result_fetcher.ResultFetcher(max_in_flight=2, timeout=5)
+    try:
+        start = time.perf_counter()
+        futures = [fetcher.submit(f"{server}/200/{i}.png") for i in range(4)]
+        for future in futures:
+            future.result(timeout=10)
+        elapsed = time.perf_counter() - start
+    finally:
+        fetcher.close()
+
+    assert elapsed >= 0.4
+
+
+def test_http_errors_surface_on_the_future(server):
+    fetcher = result_fetcher.ResultFetcher(timeout=5)
+    try:
+        future = fetcher.submit(f"{server}/missing")
+        with pytest.raises(Exception, match="404"):
+            future.result(timeout=10)
+    finally:
+        fetcher.close()
+
+
+def test_local_backend_results_are_read_from_file(tmp_path):
+    path = tmp_path / "result.png"
+    path.write_bytes(make_png((7, 0, 0)))
+    fetcher = result_fetcher.ResultFetcher(uri_schemes=("file",))
+    try:
+        img = fetcher.submit(f"file://{path}").result(timeout=10)
+    finally:
+        fetcher.close()
+
+    assert img.getpixel((0, 0)) == (7, 0, 0)
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "memory://bucket/result.png", "ftp://host/result.png", "/etc/passwd"])
+def test_only_http_results_are_fetched_by_default(url):
+    fetcher = result_fetcher.ResultFetcher()
+    try:
+        with pytest.raises(ValueError, match="Refusing"):
+            fetcher.submit(url).result(timeout=10)
+    finally:
+        fetcher.close()
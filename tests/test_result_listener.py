@@ -0,0 +1,256 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import comfy_stubs
+
+backends = comfy_stubs.load("backends")
+result_listener = comfy_stubs.load("result_listener")
+
+
+class FakeMessage:
+    def __init__(self, data):
+        self.data = data
+        self.acked = 0
+        self.nacked = 0
+
+    def ack(self):
+        self.acked += 1
+
+    def nack(self):
+        self.nacked += 1
+
+
+def result(job_id, **fields):
+    return json.dumps({"id": job_id, **fields}).encode("utf-8")
+
+
+class Collector:
+    def __init__(self, count):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.count = count
+
+    def handler(self, job_id):
+        def on_result(data):
+            with self.lock:
+                self.results[job_id] = data
+                if len(self.results) == self.count:
+                    self.done.set()
+        return on_result
+
+
+def test_results_are_routed_to_their_job():
+    transport = backends.InProcessTransport()
+    listener = result_listener.ResultListener(transport, "results")
+    listener.start()
+    try:
+        collector = Collector(3)
+        for job_id in ["a", "b", "c"]:
+            listener.register(job_id, collector.handler(job_id))
+        for job_id in ["c", "a", "b"]:
+            transport.publish("results", result(job_id, url=f"memory://bucket/{job_id}.png"))
+
+        assert collector.done.wait(5)
+        assert {job_id: data["url"] for job_id, data in collector.results.items()} == {
+            job_id: f"memory://bucket/{job_id}.png" for job_id in ["a", "b", "c"]}
+    finally:
+        listener.stop()
+
+
+def test_unknown_results_are_acked_and_dropped():
+    listener = result_listener.ResultListener(backends.InProcessTransport(), "results")
+    message = FakeMessage(result("late"))
+
+    listener._on_message(message)
+
+    assert (message.acked, message.nacked) == (1, 0)
+    # A run registering the id afterwards is not handed the dropped result
+    calls = []
+    listener.register("late", calls.append)
+    assert calls == []
+
+
+def test_late_results_of_abandoned_jobs_are_cached_by_key():
+    listener = result_listener.ResultListener(backends.InProcessTransport(), "results")
+    calls = []
+    listener.register("job", calls.append, key=("cat", 1))
+    listener.unregister("job", cache_late=True)
+
+    message = FakeMessage(result("job", url="memory://bucket/job.png"))
+    listener._on_message(message)
+
+    assert calls == [] and message.acked == 1
+    assert listener.take_cached(("cat", 1))["url"] == "memory://bucket/job.png"
+    # Handed over once
+    assert listener.take_cached(("cat", 1)) is None
+
+
+def test_late_result_cache_is_bounded():
+    listener = result_listener.ResultListener(backends.InProcessTransport(), "results", max_cached_results=2)
+    for i in range(3):
+        listener.register(f"job-{i}", lambda data: None, key=i)
+        listener.unregister(f"job-{i}", cache_late=True)
+        listener._on_message(FakeMessage(result(f"job-{i}")))
+
+    assert listener.take_cached(0) is None
+    assert [listener.take_cached(i)["id"] for i in (1, 2)] == ["job-1", "job-2"]
+
+
+def test_unregistered_jobs_no_longer_receive_results():
+    listener = result_listener.ResultListener(backends.InProcessTransport(), "results")
+    calls = []
+    listener.register("job", calls.append)
+    listener.unregister("job")
+
+    listener._on_message(FakeMessage(result("job")))
+
+    assert calls == []
+    assert listener.take_cached(None) is None
+
+
+def test_malformed_results_are_nacked():
+    listener = result_listener.ResultListener(backends.InProcessTransport(), "results")
+    message = FakeMessage(b"not json")
+
+    listener._on_message(message)
+
+    assert (message.acked, message.nacked) == (0, 1)
+
+
+def test_one_listener_per_subscription():
+    transport = backends.InProcessTransport()
+    listener = result_listener.get_result_listener(transport, "shared-results")
+    try:
+        assert result_listener.get_result_listener(transport, "shared-results") is listener
+        assert result_listener.get_result_listener(transport, "other-results") is not listener
+    finally:
+        result_listener.get_result_listener(transport, "other-results").stop()
+        listener.stop()
+
+
+class Worker:
+    """
+    Answers jobs on the memory backend with a PNG per seed, skipping the
+    seeds in ``lost`` and answering those in ``slow`` after that many seconds.
+    """
+
+    def __init__(self, node, lost=(), slow=None):
+        self.transport = backends.get_transport("memory")
+        self.store = backends.get_blob_store("memory", "worker-results")
+        self.node = node
+        self.lost = set(lost)
+        self.slow = dict(slow or {})
+        self.seeds = []
+        self.answered = threading.Semaphore(0)
+        self.future = self.transport.subscribe(node.topic_name, self.on_job)
+
+    def on_job(self, message):
+        job = json.loads(message.data)
+        message.ack()
+        seed = job["workflow"]["81"]["inputs"]["noise_seed"]
+        self.seeds.append(seed)
+        if seed in self.lost:
+            return
+        if seed in self.slow:
+            threading.Timer(self.slow[seed], self.answer, args=(job, seed)).start()
+        else:
+            self.answer(job, seed)
+
+    def answer(self, job, seed):
+        buffer = io.BytesIO()
+        Image.new("RGB", (8, 8), (seed, 0, 0)).save(buffer, format="PNG")
+        self.store.put(f"{job['id']}.png", buffer.getvalue())
+        self.transport.publish(self.node.subscription_id,
+                               result(job["id"], url=self.store.uri(f"{job['id']}.png")))
+        self.answered.release()
+
+
+@pytest.fixture
+def node(tmp_path, monkeypatch):
+    bp = comfy_stubs.load("batch_previewer")
+    lora_cache = comfy_stubs.load("lora_cache")
+    lora_path = tmp_path / "style.safetensors"
+    lora_path.write_bytes(b"lora weights")
+    workflow_path = tmp_path / "workflow.json"
+    workflow_path.write_text(json.dumps({
+        "530": {"inputs": {"text": ""}},
+        "81": {"inputs": {"noise_seed": 0}},
+        "517": {"inputs": {"lora_name": "", "strength_model": 1.0}},
+        "532": {"inputs": {"filename_prefix": ""}},
+    }))
+    monkeypatch.setattr(bp.folder_paths, "get_full_path_or_raise", lambda kind, name: str(lora_path), raising=False)
+    monkeypatch.setattr(bp, "lora_upload_cache", lora_cache.LoraUploadCache(str(tmp_path / "manifest.json")))
+    monkeypatch.setattr(bp, "workflow_template", bp.WorkflowTemplate(str(workflow_path)))
+    node = bp.BatchPreviewer()
+    yield node
+    node.get_listener("memory").stop()
+    if node.fetcher is not None:
+        node.fetcher.close()
+
+
+def test_fan_out_collects_every_result_in_seed_order(node):
+    worker = Worker(node)
+    try:
+        results = node.run_jobs("a cat", [3, 1, 2], "style.safetensors", 1.0, 4, 5.0, 10, backend="memory")
+    finally:
+        worker.future.cancel()
+
+    assert [seed for seed, _ in results] == [3, 1, 2]
+    assert [int(image[0, 0, 0, 0] * 255 + 0.5) for _, image in results] == [3, 1, 2]
+
+
+class FakeBlocker:
+    def __init__(self, message):
+        self.message = message
+
+
+def test_missing_result_blocks_its_slot(node, monkeypatch):
+    monkeypatch.setattr(comfy_stubs.load("batch_previewer"), "ExecutionBlocker", FakeBlocker)
+    worker = Worker(node, lost={2})
+    try:
+        images = node.process("a cat", "1, 2, 3", "style.safetensors", 1.0, max_wait_time=1, backend="memory")
+    finally:
+        worker.future.cancel()
+
+    assert len(images) == 4
+    assert [int(images[i][0, 0, 0, 0] * 255 + 0.5) for i in (0, 2)] == [1, 3]
+    assert isinstance(images[1], FakeBlocker) and "seed 2" in images[1].message
+    # The slot without a seed blocks silently
+    assert isinstance(images[3], FakeBlocker) and images[3].message is None
+
+
+def test_missing_result_without_blocker_names_the_seeds(node, monkeypatch):
+    monkeypatch.setattr(comfy_stubs.load("batch_previewer"), "ExecutionBlocker", None)
+    worker = Worker(node, lost={2})
+    try:
+        with pytest.raises(RuntimeError, match="no result for seeds 2"):
+            node.process("a cat", "1, 2, 3", "style.safetensors", 1.0, max_wait_time=1, backend="memory")
+    finally:
+        worker.future.cancel()
+
+
+def test_late_result_is_reused_by_the_next_run(node):
+    worker = Worker(node, slow={2: 1.5})
+    try:
+        first = node.run_jobs("a cat", [1, 2], "style.safetensors", 1.0, 4, 5.0, 1, backend="memory")
+        # Seed 2 answers after the run gave up on it
+        for _ in range(2):
+            assert worker.answered.acquire(timeout=5)
+        time.sleep(0.2)
+        second = node.run_jobs("a cat", [2, 3], "style.safetensors", 1.0, 4, 5.0, 10, backend="memory")
+        # Different content is not served from the cache
+        third = node.run_jobs("a dog", [2], "style.safetensors", 1.0, 4, 5.0, 10, backend="memory")
+    finally:
+        worker.future.cancel()
+
+    assert first[1][1] is None
+    assert [int(image[0, 0, 0, 0] * 255 + 0.5) for _, image in second] == [2, 3]
+    assert int(third[0][1][0, 0, 0, 0] * 255 + 0.5) == 2
+    # The second run published only seed 3, the third one published seed 2 again
+    assert sorted(worker.seeds[:2]) == [1, 2] and worker.seeds[2:] == [3, 2]
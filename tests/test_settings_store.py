@@ -0,0 +1,147 @@
+import gzip
+import json
+import time
+
+import pytest
+
+import comfy_stubs
+
+json_patch = comfy_stubs.load("PainterNode.json_patch")
+settings_store = comfy_stubs.load("PainterNode.settings_store")
+
+SUFFIX = ".json"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0)
+    store.ensure_loaded()
+    return store
+
+
+def add(path, value):
+    return [{"op": "add", "path": path, "value": value}]
+
+
+def test_revision_changes_with_every_save_and_patch(store):
+    first = store.save("Painter_1", b'{"a": 1}')
+    second = store.patch("Painter_1", first, add("/b", 2))
+    third = store.save("Painter_1", b'{"a": 3}')
+
+    assert len({first, second, third}) == 3
+    assert store.get_revision("Painter_1") == (b'{"a": 3}', third)
+
+
+def test_revisions_are_not_reused_after_removal(store):
+    old = store.save("Painter_1", b'{"a": 1}')
+    store.remove("Painter_1")
+    new = store.save("Painter_1", b'{"b": 1}')
+
+    assert new != old
+    with pytest.raises(settings_store.RevisionMismatch):
+        store.patch("Painter_1", old, add("/c", 1))
+
+
+def test_revisions_are_not_reused_after_restart(tmp_path, store):
+    old = store.save("Painter_1", b'{"a": 1}')
+    store.flush()
+
+    restarted = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0)
+    restarted.ensure_loaded()
+
+    _, revision = restarted.get_revision("Painter_1")
+    assert revision != old
+    with pytest.raises(settings_store.RevisionMismatch):
+        restarted.patch("Painter_1", old, add("/c", 1))
+
+
+def test_patch_applies_to_the_stored_document(store):
+    revision = store.save("Painter_1", b'{"objects": []}')
+
+    new = store.patch("Painter_1", revision, add("/objects/-", {"type": "path"}))
+
+    assert json.loads(store.get("Painter_1")) == {"objects": [{"type": "path"}]}
+    assert store.get_revision("Painter_1")[1] == new
+
+
+def test_failed_patch_leaves_stored_document_untouched(store):
+    revision = store.save("Painter_1", b'{"objects": [1]}')
+
+    with pytest.raises(json_patch.JsonPatchError):
+        store.patch("Painter_1", revision, add("/objects/-", 2) + [{"op": "test", "path": "/objects/0", "value": 2}])
+
+    assert store.get_revision("Painter_1") == (b'{"objects": [1]}', revision)
+
+
+def test_patch_against_an_old_revision_is_rejected(store):
+    old = store.save("Painter_1", b'{"a": 1}')
+    current = store.save("Painter_1", b'{"a": 2}')
+
+    with pytest.raises(settings_store.RevisionMismatch) as error:
+        store.patch("Painter_1", old, add("/b", 1))
+
+    assert error.value.revision == current
+    assert store.get("Painter_1") == b'{"a": 2}'
+
+
+def test_patch_of_unknown_node_raises_key_error(store):
+    with pytest.raises(KeyError):
+        store.patch("Painter_9", "0:0", add("/a", 1))
+
+
+def test_saves_are_written_behind(tmp_path):
+    store = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0.05)
+    store.ensure_loaded()
+    path = tmp_path / ("Painter_1" + SUFFIX)
+
+    revision = store.save("Painter_1", b'{"a": 1}')
+    store.patch("Painter_1", revision, add("/b", 2))
+    assert not path.exists()
+
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert json.loads(path.read_bytes()) == {"a": 1, "b": 2}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_large_settings_switch_to_gzip_and_back(tmp_path):
+    store = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0, gzip_threshold=100)
+    store.ensure_loaded()
+    path = tmp_path / ("Painter_1" + SUFFIX)
+    gz_path = tmp_path / ("Painter_1" + SUFFIX + settings_store.GZIP_SUFFIX)
+    large = json.dumps({"background": "x" * 1000}).encode("utf-8")
+
+    store.save("Painter_1", large)
+    store.flush()
+    assert gzip.decompress(gz_path.read_bytes()) == large and not path.exists()
+
+    restarted = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0, gzip_threshold=100)
+    restarted.ensure_loaded()
+    assert restarted.get("Painter_1") == large
+
+    store.save("Painter_1", b'{"a": 1}')
+    store.flush()
+    assert path.read_bytes() == b'{"a": 1}' and not gz_path.exists()
+
+
+def test_remove_deletes_the_file(store, tmp_path):
+    store.save("Painter_1", b'{"a": 1}')
+    store.flush()
+
+    assert store.remove("Painter_1")
+    store.flush()
+
+    assert not store.exists("Painter_1")
+    assert not list(tmp_path.glob("Painter_1*"))
+    assert not store.remove("Painter_1")
+
+
+def test_broken_files_are_reset_on_load(tmp_path):
+    (tmp_path / ("Painter_1" + SUFFIX)).write_bytes(b"{broken")
+    store = settings_store.SettingsStore(str(tmp_path), SUFFIX, write_delay=0)
+    store.ensure_loaded()
+    store.flush()
+
+    assert store.get("Painter_1") == settings_store.EMPTY_SETTINGS
+    assert (tmp_path / ("Painter_1" + SUFFIX)).read_bytes() == settings_store.EMPTY_SETTINGS
@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+import comfy_stubs
+
+startup_timing = comfy_stubs.load("startup_timing")
+
+
+@pytest.mark.parametrize("setting", ["", "0", "false", "FALSE", "no", "Off", " "])
+def test_false_values_disable_timing(setting):
+    timer = startup_timing.StartupTimer(setting)
+    with timer.phase("import"):
+        pass
+    assert not timer.enabled
+    assert timer.finish() is None
+
+
+@pytest.mark.parametrize("setting", ["1", "true", "TRUE", "True", "yes", "YES", "on", "On", "enabled"])
+def test_true_values_use_the_default_report(setting):
+    timer = startup_timing.StartupTimer(setting)
+    assert timer.enabled
+    assert timer.report_path == startup_timing.DEFAULT_REPORT_PATH
+
+
+@pytest.mark.parametrize("setting", ["report.json", "timing.JSON", "reports/startup", f"{os.sep}tmp{os.sep}startup"])
+def test_paths_are_used_as_report_path(setting):
+    assert startup_timing.StartupTimer(setting).report_path == setting
+
+
+def test_report_is_written(tmp_path):
+    path = tmp_path / "startup.json"
+    timer = startup_timing.StartupTimer(str(path))
+    with timer.phase("import"):
+        pass
+
+    report = timer.finish()
+
+    assert json.loads(path.read_text()) == report
+    assert [phase["name"] for phase in report["phases"]] == ["import"]
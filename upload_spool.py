@@ -0,0 +1,159 @@
+import atexit
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+spool_dir_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_spool')
+
+# Seconds the interpreter waits at exit for queued uploads, leftovers resume on next start
+FLUSH_TIMEOUT = 30
+
+
+class UploadSpool:
+    """
+    Persistent queue of pending blob store uploads drained by background workers.
+
+    Every entry is a ``<id>.bin`` payload plus a ``<id>.json`` descriptor
+    written last, so a crash never leaves a half-described upload. Entries
+    still on disk at startup are re-queued; entries that exhaust their retries
+    are moved to ``failed/`` for inspection.
+    """
+
+    def __init__(self, spool_dir, store_factory, workers=4, max_attempts=5, backoff=1.0):
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        # store_factory(backend, bucket_name, credentials_path) -> blob store
+        self.store_factory = store_factory
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.uploaded = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            os.makedirs(self.failed_dir, exist_ok=True)
+            pending = sorted(glob.glob(os.path.join(self.spool_dir, "*.json")), key=os.path.getmtime)
+            if pending:
+                print(f"Resuming {len(pending)} spooled upload(s)..")
+            for meta_path in pending:
+                self._queue.put(os.path.splitext(os.path.basename(meta_path))[0])
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"upload-spool-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, bucket_name, object_name, data, content_type, credentials_path, backend="gcp"):
+        """Persist ``data`` to the spool and queue its upload to ``bucket_name/object_name`` on ``backend``."""
+        self.start()
+        entry_id = uuid.uuid4().hex
+        with open(os.path.join(self.spool_dir, f"{entry_id}.bin"), "wb") as f:
+            f.write(data)
+        meta_path = os.path.join(self.spool_dir, f"{entry_id}.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({
+                "bucket": bucket_name,
+                "object": object_name,
+                "content_type": content_type,
+                "credentials": credentials_path,
+                "backend": backend,
+            }, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._queue.put(entry_id)
+        return entry_id
+
+    def _worker(self):
+        while True:
+            entry_id = self._queue.get()
+            try:
+                self._upload(entry_id)
+            except Exception as e:
+                print(f"Error in upload spool for {entry_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _upload(self, entry_id):
+        meta_path = os.path.join(self.spool_dir, f"{entry_id}.json")
+        data_path = os.path.join(self.spool_dir, f"{entry_id}.bin")
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        for attempt in range(self.max_attempts):
+            try:
+                # Entries spooled before backends were selectable are GCS uploads
+                store = self.store_factory(meta.get("backend", "gcp"), meta["bucket"], meta["credentials"])
+                store.put_file(meta["object"], data_path, content_type=meta["content_type"])
+                break
+            except Exception as e:
+                if attempt == self.max_attempts - 1:
+                    print(f"Giving up on {meta['bucket']}/{meta['object']}: {e}")
+                    for path in (data_path, meta_path):
+                        os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+                    with self._lock:
+                        self.failed += 1
+                    return
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+
+        os.remove(meta_path)
+        os.remove(data_path)
+        with self._lock:
+            self.uploaded += 1
+
+    def depth(self):
+        """Number of uploads queued or in progress."""
+        return self._queue.unfinished_tasks
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self.depth(),
+                "uploaded": self.uploaded,
+                "failed": self.failed,
+                "retries": self.retries,
+            }
+
+    def flush(self, timeout=None):
+        """Wait until the queue drains or ``timeout`` seconds pass; True if it drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_upload_spool(store_factory):
+    """Return the process-wide spool, flushed on interpreter shutdown."""
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = UploadSpool(spool_dir_path, store_factory)
+            _spool.start()
+            atexit.register(_flush_at_exit, _spool)
+        return _spool
+
+
+def _flush_at_exit(spool):
+    if spool.depth():
+        print(f"Flushing {spool.depth()} spooled upload(s)..")
+        if not spool.flush(FLUSH_TIMEOUT):
+            print(f"{spool.depth()} upload(s) left in {spool.spool_dir}, they resume on next start.")
@@ -0,0 +1,137 @@
+import copy
+import json
+import logging
+import os
+import threading
+import uuid
+
+# Patch point name -> (node id, input key) in the BatchPreviewer workflow
+DEFAULT_PATCH_POINTS = {
+    "prompt": ("530", "text"),
+    "seed": ("81", "noise_seed"),
+    "lora_name": ("517", "lora_name"),
+    "strength_model": ("517", "strength_model"),
+    "filename_prefix": ("532", "filename_prefix"),
+}
+
+
+class JobEncoder:
+    """
+    Serializes a job template once and splices per-job values into it.
+
+    Each patch point (a key path such as ``("workflow", "81", "inputs",
+    "noise_seed")``) is replaced by a unique marker before ``json.dumps``;
+    ``encode`` then joins the constant pieces with the JSON of the values,
+    so the shared workflow is never copied or re-serialized per job.
+    Paths whose parent is missing from the template are skipped.
+    """
+
+    def __init__(self, template, paths):
+        template = copy.deepcopy(template)
+        markers = {}
+        self.paths = []
+        for path in paths:
+            parent = template
+            for key in path[:-1]:
+                parent = parent.get(key) if isinstance(parent, dict) else None
+            if not isinstance(parent, dict):
+                continue
+            marker = f"__job_patch_{uuid.uuid4().hex}__"
+            parent[path[-1]] = marker
+            markers[json.dumps(marker)] = tuple(path)
+            self.paths.append(tuple(path))
+
+        encoded = json.dumps(template)
+        found = sorted((encoded.index(m), m) for m in markers)
+        self.pieces = []
+        self.order = []
+        start = 0
+        for index, marker in found:
+            self.pieces.append(encoded[start:index])
+            self.order.append(markers[marker])
+            start = index + len(marker)
+        self.pieces.append(encoded[start:])
+
+    def encode(self, values):
+        """Return the UTF-8 job message with ``values[path]`` at every patch point."""
+        parts = [self.pieces[0]]
+        for path, piece in zip(self.order, self.pieces[1:]):
+            parts.append(json.dumps(values[path]))
+            parts.append(piece)
+        return "".join(parts).encode("utf-8")
+
+
+class WorkflowSnapshot:
+    """
+    One loaded version of a WorkflowTemplate, to encode a whole fan-out from.
+
+    ``version`` identifies the file contents it was built from, for keys of
+    results that depend on the workflow.
+    """
+
+    def __init__(self, encoder, paths, version=None):
+        self.encoder = encoder
+        self.paths = paths
+        self.version = version
+
+    def encode_job(self, job_id, uploads, values):
+        """Return the serialized job message for ``values`` without building a workflow dict."""
+        patch = {("id",): job_id, ("uploads",): uploads}
+        for name, path in self.paths.items():
+            patch[path] = values[name]
+        return self.encoder.encode(patch)
+
+
+class WorkflowTemplate:
+    """
+    API-format workflow loaded once and re-read only when its mtime changes.
+
+    ``patch_points`` maps a name to the ``(node id, input key)`` it sets.
+    Points whose node is missing from the workflow are ignored, like the
+    ``if "530" in workflow`` checks they replace.
+    """
+
+    def __init__(self, path, patch_points=None):
+        self.path = path
+        self.patch_points = dict(DEFAULT_PATCH_POINTS if patch_points is None else patch_points)
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._workflow = None
+        self._points = {}
+        self._encoder = None
+
+    def load(self):
+        """Return the parsed workflow, reloading it if the file changed on disk."""
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if mtime_ns != self._mtime_ns:
+                with open(self.path) as f:
+                    workflow = json.load(f)
+                self._workflow = workflow
+                self._points = {
+                    name: (node_id, key)
+                    for name, (node_id, key) in self.patch_points.items()
+                    if isinstance(workflow.get(node_id), dict) and "inputs" in workflow[node_id]
+                }
+                self._encoder = JobEncoder(
+                    {"id": None, "workflow": workflow, "uploads": None},
+                    [("id",), ("uploads",)] + [self._path(name) for name in self._points])
+                self._mtime_ns = mtime_ns
+                logging.info(f"Loaded workflow template {self.path}.")
+            return self._workflow
+
+    def _path(self, name):
+        node_id, key = self._points[name]
+        return ("workflow", node_id, "inputs", key)
+
+    def snapshot(self):
+        """
+        Return the current encoder and patch paths as a WorkflowSnapshot.
+
+        Checks the file once; every job encoded from the snapshot uses the
+        same version even if the file changes meanwhile.
+        """
+        self.load()
+        with self._lock:
+            return WorkflowSnapshot(self._encoder, {name: self._path(name) for name in self._points},
+                                    (self.path, self._mtime_ns))